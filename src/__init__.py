@@ -14,7 +14,6 @@ import sys
 import lightbulb.actions as actions
 import lightbulb.constants as constants
 import lightbulb.exceptions as exceptions
-import lightbulb.systemspecific as systemspecific
 
 class LightBulb:
 
@@ -23,18 +22,9 @@ class LightBulb:
         Run LightBulb.
         """
 
-        self._check_os()
         self._init_parser()
         self._init_action()
 
-    def _check_os(self):
-        """
-        """
-
-        if systemspecific.os_name is None:
-            print(constants.EXITMESSAGE_UNSUPPORTEDOS)
-            sys.exit(constants.EXITSTATUS_UNSUPPORTEDOS)
-
     def _init_parser(self):
         """
         Initialise argument parser.
@@ -59,11 +49,18 @@ class LightBulb:
 
         # Loop through the modules collecting their additional parameters
         #   Check __init__.py in the action package's directory for the other
-        #   half of this hack.
-        for action in actions.__all__:
-            module = getattr(actions, action)
-            self.subparsers[action] = module.init_subparser(
-              self.subparser_factory.add_parser(action))
+        #   half of this hack. Only the action named on the command line (the
+        #   first argument that isn't an option, since the root parser takes
+        #   none of its own) needs its parameters, so we only import that one;
+        #   the rest just need to be listed.
+        action = next((arg for arg in sys.argv[1:] if not arg.startswith("-")),
+          None)
+
+        for name in actions.__all__:
+            subparser = self.subparser_factory.add_parser(name)
+            if name == action:
+                subparser = getattr(actions, name).init_subparser(subparser)
+            self.subparsers[name] = subparser
 
         # Parse the arguments
         self.arguments = self.parser.parse_args()
@@ -74,7 +71,14 @@ class LightBulb:
         """
 
         # Run the action by instantiating its class
-        getattr(actions, self.arguments.action).Action(self.arguments)
+        #   We only find out whether we support the OS when an action first
+        #   needs something system-specific, so that actions which don't
+        #   (validating a profile, for instance) work everywhere.
+        try:
+            getattr(actions, self.arguments.action).Action(self.arguments)
+        except exceptions.UnsupportedOperatingSystemError:
+            print(constants.EXITMESSAGE_UNSUPPORTEDOS)
+            sys.exit(constants.EXITSTATUS_UNSUPPORTEDOS)
 
 if __name__ == "__main__":
     LightBulb()
@@ -5,15 +5,28 @@
 # Licensing information available at
 #   http://github.com/cloudflux/lightbulb
 
-import pkgutil
+import importlib
+import os
 
 # Make submodules accessible
-#   This is fairly dirty, but it does work. We need to load all submodules here
-#   so that they're accessible to anything that imports this package can access
-#   them. Sadly, there's no nice alternative to dir() for packages. and __all__
-#   only represents submodules that have already been loaded.
-__all__ = []
-for (loader, module_name, is_package) in pkgutil.walk_packages(__path__):
-    __all__.append(module_name)
-    module = loader.find_module(module_name).load_module(module_name)
-    exec("%s = module" %(module_name))
+#   Importing every submodule up front means paying for all of them (and
+#   anything they import) even when we only need one, so instead we just list
+#   their names in __all__ here. Each is imported the first time it's accessed
+#   as an attribute of this package; see __getattr__() below. We list the
+#   directory ourselves, since pkgutil is surprisingly expensive to import.
+__all__ = sorted(file_name[:-3] for file_name in os.listdir(__path__[0])
+  if file_name.endswith(".py") and not file_name.startswith("_"))
+
+def __getattr__(name):
+    """
+    Import a submodule on first access.
+
+    This is only called for attributes that don't already exist, and importing
+    a submodule binds it to the package, so each is only imported once.
+    """
+
+    if name not in __all__:
+        raise AttributeError("module '%s' has no attribute '%s'" %(
+          __name__, name))
+
+    return importlib.import_module("%s.%s" %(__name__, name))
@@ -5,15 +5,27 @@
 # Licensing information available at
 #   http://github.com/cloudflux/lightbulb
 
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 import logging
+import logging.handlers
 import os
 import shutil
 import tempfile
+import time
 from time import strftime
 
 import lightbulb.applications as applications
 import lightbulb.cast as cast
+import lightbulb.config as config
+import lightbulb.graph as graph
+import lightbulb.history as history
 import lightbulb.profile as profile
+import lightbulb.report as report
+import lightbulb.sourcetrees as sourcetrees
+from lightbulb.systemspecific import which_many
+from lightbulb.systemspecific.packagefilters import filter_pkgs
+from lightbulb.systemspecific.packagemanagers import get_pkg_mgr
 
 def init_subparser(subparser):
     """
@@ -24,12 +36,14 @@ def init_subparser(subparser):
     system.
     """
 
-    # Path to the profile file
+    # Paths to the profile files
     subparser.add_argument(
       "-p",
       "--profile",
-      help     = "build profile",
-      dest     = "profile_file",
+      help     = "build profile, or a directory of them; may be given more "
+                 + "than once to build several profiles together",
+      action   = "append",
+      dest     = "profile_files",
       required = True
     )
 
@@ -53,6 +67,48 @@ def init_subparser(subparser):
       dest    = "erase_work_dir"
     )
 
+    # Number of components to build concurrently
+    subparser.add_argument(
+      "-j",
+      "--jobs",
+      help    = "number of independent components to build at once",
+      type    = int,
+      default = 1,
+      dest    = "jobs"
+    )
+
+    # Total compiler jobs across all components
+    subparser.add_argument(
+      "--make-jobs",
+      help    = "maximum number of compiler jobs to run at once, shared "
+                + "between all components (default: based on CPUs and memory)",
+      type    = int,
+      default = None,
+      dest    = "make_jobs"
+    )
+
+    # Compiler cache
+    subparser.add_argument(
+      "--ccache",
+      help    = "compile through ccache",
+      action  = "store_true",
+      dest    = "ccache"
+    )
+
+    subparser.add_argument(
+      "--ccache-dir",
+      help    = "ccache cache directory",
+      default = None,
+      dest    = "ccache_dir"
+    )
+
+    subparser.add_argument(
+      "--ccache-size",
+      help    = "ccache maximum cache size (e.g. 5G)",
+      default = None,
+      dest    = "ccache_size"
+    )
+
     # File feedback level
     subparser.add_argument(
       "-l",
@@ -77,6 +133,40 @@ def init_subparser(subparser):
 
     return subparser
 
+def profile_paths(paths):
+    """
+    Expand profile arguments into a list of profile files.
+
+    Directories are replaced by the YAML files they contain, in name order.
+    """
+
+    files = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend("%s/%s" %(path, file_name)
+              for file_name in sorted(os.listdir(path))
+              if file_name.endswith((".yaml", ".yml")))
+        else:
+            files.append(path)
+
+    return files
+
+def find_shared_sources(profiles):
+    """
+    Find the sources needed by more than one component.
+
+    Returns a set of (application, version) tuples.
+    """
+
+    versions = {}
+    for p in profiles:
+        for ac in p.components:
+            key = (ac.application, ac.version)
+            versions[key] = versions.get(key, 0) + 1
+
+    return set(key for (key, count) in versions.items() if count > 1)
+
 class Action:
     """
     Build action handler.
@@ -88,15 +178,66 @@ class Action:
         """
 
         self.arguments = arguments
+        self.report = report.Report()
+        self.dependencies = None
 
         # Do all environment-related configuration here
-        self._init_work_dir()
-        self._init_logging()
+        self._run_stage("config", self._init_config)
+        self._run_stage("system", self._init_system)
+        self._run_stage("work-dir", self._init_work_dir)
+        self._run_stage("logging", self._init_logging)
+
+        try:
+            self._run_stage("toolchain", self._init_toolchain)
+
+            # ...and then begin the build process
+            self._run_stage("profiles", self._init_profiles)
+            self._init_dependencies()
+            self._run_stage("sources", self._init_sources)
+            self._run_stage("build", self._init_build)
+            self._run_stage("cleanup", self._init_cleanup)
+        finally:
+            # Even if the build failed, the package manager mustn't be left
+            # running (and logging) after we return
+            if self.dependencies is not None:
+                wait([self.dependencies])
+
+            self._save_history()
+            self._write_report()
+            self._close_logging()
+
+    def _run_stage(self, name, method):
+        """
+        Run a stage of the build, timing it in the build report.
+        """
 
-        # ...and then begin the build process
-        self._init_profile()
-        self._init_build()
-        self._init_cleanup()
+        with self.report.span("action/%s" %(name)):
+            method()
+
+    def _init_config(self):
+        """
+        Apply configuration overrides from the command line.
+        """
+
+        if self.arguments.make_jobs:
+            config.build["jobs"] = self.arguments.make_jobs
+
+        if self.arguments.ccache:
+            config.compiler_cache["enabled"] = True
+        if self.arguments.ccache_dir:
+            config.compiler_cache["directory"] = self.arguments.ccache_dir
+        if self.arguments.ccache_size:
+            config.compiler_cache["max_size"] = self.arguments.ccache_size
+
+    def _init_system(self):
+        """
+        Ensure we're able to interface with the system's package manager.
+
+        This is where we'd first discover the OS is unsupported, and it's better
+        to do so before we've created the working directory.
+        """
+
+        get_pkg_mgr()
 
     def _init_logging(self):
         """
@@ -111,31 +252,85 @@ class Action:
         log file and the shell simultaneously.
         """
 
-        self.logger = logging.getLogger("log")
-        self.logger.setLevel(logging.DEBUG)
+        self._log_handlers = []
+
+        self.log_file = "%s/lightbulb.log" %(self.work_dir)
+        self.logger = self._open_log(self.log_file)
+
+    def _open_log(self, log_file, name = None):
+        """
+        Create a logger writing to both the shell and a log file.
+
+        Each logger is deliberately not registered with the logging module, so
+        that builds running side by side in one process don't write to each
+        other's logs. If a name is given, it prefixes the shell output.
+        """
+
+        logger = logging.Logger("lightbulb")
+        logger.setLevel(logging.DEBUG)
 
-        self.log_format = logging.Formatter(
+        log_format = logging.Formatter(
           fmt     = "[%(asctime)s] [%(levelname)-1s] %(message)s",
           datefmt = "%d/%m/%Y %I:%M:%S"
         )
 
-        self.shell_handler = logging.StreamHandler()
-        self.shell_handler.setLevel(getattr(logging,
+        if name is None:
+            shell_format = log_format
+        else:
+            shell_format = logging.Formatter(
+              fmt     = "[%%(asctime)s] [%%(levelname)-1s] [%s] %%(message)s"
+                        %(name.replace("%", "%%")),
+              datefmt = "%d/%m/%Y %I:%M:%S"
+            )
+
+        shell_handler = logging.StreamHandler()
+        shell_handler.setLevel(getattr(logging,
           self.arguments.output_level.upper()))
-        self.shell_handler.setFormatter(self.log_format)
-        self.logger.addHandler(self.shell_handler)
+        shell_handler.setFormatter(shell_format)
+        logger.addHandler(shell_handler)
 
-        self.log_file = "%s/lightbulb.log" %(self.work_dir)
-        self.log_handler = logging.handlers.RotatingFileHandler(
-          filename    = self.log_file,
+        log_handler = logging.handlers.RotatingFileHandler(
+          filename    = log_file,
           mode        = "w"
         )
-        self.log_handler.setLevel(getattr(logging,
+        log_handler.setLevel(getattr(logging,
           self.arguments.log_level.upper()))
-        self.log_handler.setFormatter(self.log_format)
-        self.logger.addHandler(self.log_handler)
+        log_handler.setFormatter(log_format)
+        logger.addHandler(log_handler)
+
+        self._log_handlers.append((logger, shell_handler))
+        self._log_handlers.append((logger, log_handler))
+
+        logger.info("Now logging to %s" %(log_file))
+
+        return logger
+
+    def _close_logging(self):
+        """
+        Detach and close all of our log handlers.
+        """
+
+        for (logger, handler) in self._log_handlers:
+            logger.removeHandler(handler)
+            handler.close()
+
+    def _init_toolchain(self):
+        """
+        Locate the utilities the build depends upon.
+
+        These are all found in a single pass over PATH, and remembered for the
+        rest of the build. Missing utilities aren't fatal here, since the
+        package manager may yet install them.
+        """
+
+        tools = which_many(["gcc", "make", "tar", "yum",
+          config.permission_elevation["elevator"]])
 
-        self.logger.info("Now logging to %s" %(self.log_file))
+        for (tool, path) in sorted(tools.items()):
+            if path is None:
+                self.logger.debug("Couldn't find %s" %(tool))
+            else:
+                self.logger.debug("Found %s at %s" %(tool, path))
 
     def _init_work_dir(self):
         """
@@ -145,40 +340,214 @@ class Action:
         #   Put simply, discard anything before and including the final "/", and
         #   do the same with anything after and including the final ".". There's
         #   almost certainly a better way of doing this, but it works!
+        #
+        #   When building several profiles at once, there's no one name to use.
         if not self.arguments.work_dir:
+            if len(self.arguments.profile_files) == 1:
+                name = "_".join(self.arguments.profile_files[0]
+                  .split("/")[-1:][0].split(".")[:-1])
+            else:
+                name = "fleet"
+
             self.arguments.work_dir = "_%s_%s" %(
-              "_".join(self.arguments.profile_file.split("/")[-1:][0]
-                .split(".")[:-1]),
-              strftime("%d-%m-%Y_%I-%M-%S")
-            )
+              name, strftime("%d-%m-%Y_%I-%M-%S"))
 
         self.work_dir = tempfile.mkdtemp(suffix = self.arguments.work_dir)
 
-    def _init_profile(self):
+    def _init_profiles(self):
         """
+        Load the profiles we're building.
+
+        A single profile builds directly within the working directory and logs
+        to its lightbulb.log. When building several, each gets a numbered
+        subdirectory of the working directory with a lightbulb.log of its own.
         """
 
-        self.logger.info("Parsing profile")
-        self.profile = profile.load_file(self.arguments.profile_file)
-        self.logger.info("Interpreted profile as:\n%s" %(self.profile))
+        self.logger.info("Parsing profiles")
+
+        # The build daemon may hand us the profile's contents directly
+        profile_string = getattr(self.arguments, "profile_string", None)
+        if profile_string is not None:
+            profiles = [profile.load_string(profile_string)]
+        else:
+            profiles = [profile.load_file(path)
+              for path in profile_paths(self.arguments.profile_files)]
+
+        self.builds = []
+
+        if len(profiles) == 1:
+            self.builds.append(ProfileBuild(profiles[0], self.work_dir,
+              self.logger))
+        else:
+            profile_id = 0
+
+            for p in profiles:
+                profile_work_dir = "%s/%d" %(self.work_dir, profile_id)
+                os.mkdir(profile_work_dir)
+
+                self.builds.append(ProfileBuild(p, profile_work_dir,
+                  self._open_log("%s/lightbulb.log" %(profile_work_dir),
+                  p.name), "%d/" %(profile_id)))
+                profile_id += 1
+
+        for b in self.builds:
+            b.logger.info("Interpreted profile as:\n%s" %(b.profile))
+
+    def _init_dependencies(self):
+        """
+        Start installing the build dependencies in the background.
+
+        Components only need their dependencies once they come to configure
+        their source, so they download and extract it while we install them.
+        """
+
+        executor = ThreadPoolExecutor(max_workers = 1)
+        self.dependencies = executor.submit(self._run_stage, "dependencies",
+          self._install_dependencies)
+        executor.shutdown(wait = False)
+
+    def _install_dependencies(self):
+        """
+        Install the build dependencies of every component.
+
+        Rather than have each component install its own dependencies (paying
+        the package manager's start-up cost every time, and often requesting
+        the same packages again), we install the union of them all at once,
+        before any component starts building.
+        """
+
+        self.logger.info("Installing build dependencies")
+
+        deps = []
+        for b in self.builds:
+            for ac in b.profile.components:
+                deps.extend(ac.dependencies)
+
+        pkgs = filter_pkgs(deps)
+        self.logger.info("Required packages: %s" %(", ".join(pkgs)))
+
+        pkg_mgr = get_pkg_mgr()
+        installed = pkg_mgr.installed_pkgs()
+
+        # Only record how long this took if there was anything to install, so
+        # that planned builds aren't told to expect an installation for nothing
+        start = time.time()
+        pkg_mgr.install_pkgs(pkgs)
+
+        build_history = history.get_history()
+        if build_history is not None and any(p not in installed for p in pkgs):
+            build_history.record("dependencies", time.time() - start)
+
+        self.logger.info("Finished installing build dependencies")
+
+    def _init_sources(self):
+        """
+        Prepare the store components check their source code out of.
+
+        Each version of an application's source is only downloaded and
+        extracted once, into the source tree store, and every component clones
+        its own tree from there. If the persistent store has been disabled, we
+        use a temporary one within the working directory, so components
+        building the same version still share it.
+        """
+
+        self.shared_sources = find_shared_sources(
+          [b.profile for b in self.builds])
+
+        self.source_trees = sourcetrees.get_source_tree_store()
+        if self.source_trees is None:
+            self.source_trees = sourcetrees.SourceTreeStore(
+              "%s/sources" %(self.work_dir))
+
+        for (application, version) in sorted(self.shared_sources):
+            self.logger.info("Sharing %s %s source between components" %(
+              application, version))
 
     def _init_build(self):
         """
+        Build the profiles' components.
+
+        Components are scheduled according to the dependencies declared between
+        them, and up to --jobs components which don't depend upon one another
+        (including those of different profiles) are built concurrently. Each
+        builds within its own subdirectory of its profile's working directory.
         """
 
         self.logger.info("Beginning build process")
 
-        app_id = 0
+        build_graph = graph.TaskGraph()
 
-        for ac in self.profile.components:
-            app_work_dir = "%s/%s" %(self.work_dir, str(app_id))
-            os.mkdir(app_work_dir)
-            getattr(applications, ac.application).ComponentBuilder(ac,
-              self.logger, app_work_dir)
-            app_id += 1
+        for b in self.builds:
+            app_id = 0
+
+            for ac in b.profile.components:
+                app_work_dir = "%s/%s" %(b.work_dir, str(app_id))
+                build_graph.add(b.prefix + ac.name,
+                  partial(self._build_component, b, ac, app_work_dir),
+                  [b.prefix + r for r in ac.requires])
+                app_id += 1
+
+        build_graph.run(self.arguments.jobs)
+
+        # Every component may have come from the build cache without waiting
+        # for the dependencies, so make sure they were installed
+        self.dependencies.result()
 
         self.logger.info("Build process complete")
 
+    def _build_component(self, b, ac, app_work_dir):
+        """
+        Build a single component.
+
+        This is a helper method for _init_build().
+        """
+
+        name = b.prefix + ac.name
+
+        os.mkdir(app_work_dir)
+        with self.report.span(name, application = ac.application,
+          version = ac.version):
+            getattr(applications, ac.application).ComponentBuilder(ac,
+              b.logger, app_work_dir, install_dependencies = False,
+              source_trees = self.source_trees,
+              build_report = self.report.prefixed("%s/" %(name)),
+              await_dependencies = self.dependencies.result)
+
+    def _save_history(self):
+        """
+        Save the durations of the build steps we've completed.
+
+        Failing to do so shouldn't fail the build.
+        """
+
+        build_history = history.get_history()
+        if build_history is None:
+            return
+
+        try:
+            build_history.save()
+        except OSError as e:
+            self.logger.warning("Couldn't save the build history: %s" %(e))
+
+    def _write_report(self):
+        """
+        Write the build report.
+
+        The report is written alongside lightbulb.log, unless the working
+        directory has already been erased, and added to the report log we
+        keep across builds.
+        """
+
+        if not config.report["enabled"]:
+            return
+
+        try:
+            if os.path.isdir(self.work_dir):
+                self.report.write("%s/report.json" %(self.work_dir))
+            self.report.append(config.report["path"])
+        except OSError as e:
+            self.logger.warning("Couldn't write the build report: %s" %(e))
+
     def _init_cleanup(self):
         """
         Clean up any temporary kludge left behind by the build.
@@ -203,3 +572,21 @@ class Action:
             self.logger.info("Left working directory intact - it will need to "
               + "be removed manually")
         self.logger.info("Cleanup process complete")
+
+class ProfileBuild:
+    """
+    A profile being built, along with its working directory and logger.
+
+    The prefix distinguishes the names of its components from those of other
+    profiles' components when several are built together.
+    """
+
+    def __init__(self, profile, work_dir, logger, prefix = ""):
+        """
+        Initialise the build's details.
+        """
+
+        self.profile  = profile
+        self.work_dir = work_dir
+        self.logger   = logger
+        self.prefix   = prefix
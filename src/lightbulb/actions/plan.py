@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+import lightbulb.actions.build as build
+import lightbulb.applications as applications
+import lightbulb.exceptions as exceptions
+import lightbulb.history as history
+import lightbulb.profile as profile
+from lightbulb.systemspecific.packagefilters import filter_pkgs
+from lightbulb.systemspecific.packagemanagers import get_pkg_mgr
+
+def init_subparser(subparser):
+    """
+    Configure the plan action argument parser.
+
+    Planning a build takes the same profiles as the build itself.
+    """
+
+    # Paths to the profile files
+    subparser.add_argument(
+      "-p",
+      "--profile",
+      help     = "build profile, or a directory of them; may be given more "
+                 + "than once to plan building several profiles together",
+      action   = "append",
+      dest     = "profile_files",
+      required = True
+    )
+
+    return subparser
+
+class Action:
+    """
+    Plan action handler.
+
+    This works out everything the build action would do with the same
+    profiles (the packages it would install, each component's configure line
+    and which build steps would be satisfied from our caches) and prints it,
+    along with estimates of how long each step will take based on previous
+    builds. Nothing is downloaded, built or installed.
+
+    Steps our caches would satisfy are estimated from previous builds in which
+    they did (recorded as "<step>-cached"), rather than from those in which
+    the step had to do its work.
+    """
+
+    def __init__(self, arguments):
+        """
+        Run LightBulb's plan action.
+        """
+
+        self.arguments = arguments
+        self.history = history.get_history()
+        self.total = 0
+        self.unknown = False
+
+        self._init_profiles()
+        self._plan_dependencies()
+        self._plan_components()
+
+        if self.unknown:
+            print("Estimated total: unknown (some steps have never been timed)")
+        else:
+            print("Estimated total: %s (building one component at a time)" %(
+              self._format_duration(self.total)))
+
+    def _init_profiles(self):
+        """
+        Load the profiles we're planning.
+        """
+
+        self.profiles = [profile.load_file(path)
+          for path in build.profile_paths(self.arguments.profile_files)]
+
+    def _plan_dependencies(self):
+        """
+        Print the packages the build would install.
+
+        Only the package manager needs to know about the system, so if we don't
+        support it we still plan everything else.
+        """
+
+        deps = []
+        for p in self.profiles:
+            for ac in p.components:
+                deps.extend(ac.dependencies)
+
+        print("Packages")
+
+        try:
+            pkgs = filter_pkgs(deps)
+            installed = get_pkg_mgr().installed_pkgs()
+        except exceptions.UnsupportedOperatingSystemError:
+            print("  Unknown: this operating system isn't supported\n")
+            return
+
+        missing = [p for p in pkgs if p not in installed]
+        present = [p for p in pkgs if p in installed]
+
+        if missing:
+            print("  To install: %s" %(", ".join(missing)))
+            print("  Installation time: %s" %(self._estimate("dependencies")))
+        if present:
+            print("  Already installed: %s" %(", ".join(present)))
+        print("")
+
+    def _plan_components(self):
+        """
+        Print the steps involved in building each component.
+        """
+
+        shared_sources = build.find_shared_sources(self.profiles)
+        fetched = set()
+
+        for p in self.profiles:
+            print(p.name)
+
+            for ac in p.components:
+                application = getattr(applications, ac.application)
+                source = (ac.application, ac.version)
+
+                # The first component to need a shared source fetches it for
+                # the rest
+                shared = source in fetched
+                if source in shared_sources:
+                    fetched.add(source)
+
+                print("  %s (%s %s)" %(ac.name, ac.application, ac.version))
+                if ac.requires:
+                    print("    After: %s" %(", ".join(ac.requires)))
+                print("    %s" %(" ".join(
+                  application.get_configure_opts(ac))))
+
+                for (step, status) in application.plan(ac, shared):
+                    if status == "shared":
+                        estimate = "-"
+                    else:
+                        key = step
+                        if status == "cached":
+                            key = "%s-cached" %(step)
+
+                        estimate = self._estimate(
+                          "%s/%s/%s" %(ac.application, ac.version, key),
+                          "%s/*/%s" %(ac.application, key))
+
+                    print("    %-18s%-8s%s" %(step, status, estimate))
+
+            print("")
+
+    def _estimate(self, *patterns):
+        """
+        Format the estimated duration of a step, adding it to the total.
+
+        This is a helper method for _plan_dependencies() and
+        _plan_components().
+
+        If we can't estimate the step, we can't estimate the total either.
+        """
+
+        if self.history is None:
+            self.unknown = True
+            return "?"
+
+        duration = self.history.estimate(*patterns)
+        if duration is None:
+            self.unknown = True
+            return "?"
+
+        self.total += duration
+        return "~%s" %(self._format_duration(duration))
+
+    def _format_duration(self, duration):
+        """
+        Format a duration in seconds for display.
+        """
+
+        if duration < 60:
+            return "%.1fs" %(duration)
+
+        return "%dm %02ds" %(duration // 60, duration % 60)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+
+import lightbulb.actions.build as build
+import lightbulb.exceptions as exceptions
+
+def init_subparser(subparser):
+    """
+    Configure the serve action argument parser.
+
+    The daemon needs to know where to listen and how much work to take on at
+    once.
+    """
+
+    # Path to the Unix socket
+    subparser.add_argument(
+      "-s",
+      "--socket",
+      help    = "path of the Unix socket to listen on",
+      default = "~/.lightbulb/lightbulb.sock",
+      dest    = "socket"
+    )
+
+    # Number of builds to run at once
+    subparser.add_argument(
+      "-c",
+      "--concurrency",
+      help    = "number of builds to run at once",
+      type    = int,
+      default = 1,
+      dest    = "concurrency"
+    )
+
+    # Number of builds which may be waiting
+    subparser.add_argument(
+      "-q",
+      "--queue-size",
+      help    = "number of builds which may wait for a free worker before "
+                + "further jobs are rejected",
+      type    = int,
+      default = 16,
+      dest    = "queue_size"
+    )
+
+    return subparser
+
+class Job:
+    """
+    A single build requested of the daemon.
+    """
+
+    def __init__(self, job_id, request):
+        """
+        Initialise the job from a client's request.
+        """
+
+        self.id      = job_id
+        self.request = request
+        self.result  = None
+        self.done    = threading.Event()
+
+    def arguments(self):
+        """
+        Get the build action arguments for this job.
+
+        We start from the build action's defaults, exactly as if it had been
+        invoked on the command line, and apply any options in the request.
+        """
+
+        parser = argparse.ArgumentParser()
+        build.init_subparser(parser)
+
+        profile_file = self.request.get("profile", "job-%d.yaml" %(self.id))
+        arguments = parser.parse_args(["-p", profile_file])
+        arguments.profile_string = self.request.get("yaml")
+
+        for key in ("work_dir", "erase_work_dir", "jobs", "log_level"):
+            if key in self.request:
+                setattr(arguments, key, self.request[key])
+
+        return arguments
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Build daemon connection handler.
+
+    Clients send a build job as a single line of JSON, containing either the
+    path of a profile file ("profile") or the YAML of a profile ("yaml"), and
+    optionally any of "work_dir", "erase_work_dir", "jobs" and "log_level". We
+    reply with a line of JSON saying whether the job was queued, then another
+    once the build has finished.
+    """
+
+    def handle(self):
+        """
+        Handle a connection.
+        """
+
+        daemon = self.server.daemon
+
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            if not isinstance(request, dict) or ("profile" not in request
+              and "yaml" not in request):
+                raise ValueError("either profile or yaml is required")
+        except ValueError as e:
+            self._reply({"status": "rejected", "error": str(e)})
+            return
+
+        job = daemon.submit(request)
+        if job is None:
+            self._reply({"status": "rejected", "error": "queue full"})
+            return
+
+        self._reply({"job": job.id, "status": "queued"})
+
+        job.done.wait()
+        self._reply(job.result)
+
+    def _reply(self, message):
+        """
+        Send a line of JSON to the client.
+
+        The client is free to hang up without waiting for the build, so we
+        don't care if it's no longer listening.
+        """
+
+        try:
+            self.wfile.write(("%s\n" %(json.dumps(message))).encode("utf-8"))
+            self.wfile.flush()
+        except OSError:
+            pass
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Build daemon socket server.
+    """
+
+    daemon_threads = True
+
+class Action:
+    """
+    Serve action handler.
+
+    This runs LightBulb as a long-lived daemon, accepting build jobs over a
+    Unix socket. Jobs wait in a bounded queue for one of a fixed number of
+    workers. Since every build runs in this one process, everything we cache
+    in memory (the installed package index, utility paths, the source and
+    artifact caches and recently parsed profiles) stays warm from one job to
+    the next.
+    """
+
+    def __init__(self, arguments):
+        """
+        Run LightBulb's serve action.
+        """
+
+        self.arguments = arguments
+
+        self._init_logging()
+        self._init_queue()
+        self._init_workers()
+        self._init_server()
+
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            self.logger.info("Shutting down")
+        finally:
+            self.server.server_close()
+            os.unlink(self.socket)
+
+    def _init_logging(self):
+        """
+        Initialise logging.
+
+        The daemon only logs to the shell; each build keeps its own
+        lightbulb.log in its working directory.
+        """
+
+        self.logger = logging.Logger("lightbulb-serve")
+
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(
+          fmt     = "[%(asctime)s] [%(levelname)-1s] %(message)s",
+          datefmt = "%d/%m/%Y %I:%M:%S"
+        ))
+        self.logger.addHandler(handler)
+
+    def _init_queue(self):
+        """
+        Initialise the job queue.
+        """
+
+        self.queue = queue.Queue(maxsize = max(1, self.arguments.queue_size))
+        self.job_ids = itertools.count(1)
+
+    def _init_workers(self):
+        """
+        Start the worker threads.
+        """
+
+        for i in range(max(1, self.arguments.concurrency)):
+            worker = threading.Thread(target = self._work)
+            worker.daemon = True
+            worker.start()
+
+    def _init_server(self):
+        """
+        Start listening on the socket.
+
+        If a socket already exists at the path and nothing is listening on it,
+        it's left over from a daemon which didn't shut down cleanly, so we
+        replace it. We refuse to replace anything else: a file which isn't a
+        socket (the path was probably mistyped), or the socket of a daemon
+        that's still running.
+        """
+
+        self.socket = os.path.expanduser(self.arguments.socket)
+        os.makedirs(os.path.dirname(self.socket) or ".", exist_ok = True)
+
+        if os.path.lexists(self.socket):
+            if not stat.S_ISSOCK(os.lstat(self.socket).st_mode):
+                raise exceptions.ServerSocketError(self.socket,
+                  "the path exists and isn't a socket")
+
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket)
+            except OSError:
+                os.unlink(self.socket)
+            else:
+                raise exceptions.ServerSocketError(self.socket,
+                  "another daemon is listening on it")
+            finally:
+                probe.close()
+
+        self.server = Server(self.socket, RequestHandler)
+        self.server.daemon = self
+
+        self.logger.info("Listening on %s" %(self.socket))
+
+    def submit(self, request):
+        """
+        Queue a job, returning it, or None if the queue is full.
+        """
+
+        job = Job(next(self.job_ids), request)
+
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            self.logger.warning("Rejected job; the queue is full")
+            return None
+
+        self.logger.info("Queued job %d" %(job.id))
+        return job
+
+    def _work(self):
+        """
+        Run queued jobs, forever.
+        """
+
+        while True:
+            job = self.queue.get()
+            self.logger.info("Starting job %d" %(job.id))
+
+            try:
+                action = build.Action(job.arguments())
+                job.result = {
+                    "job"     : job.id,
+                    "status"  : "succeeded",
+                    "work_dir": action.work_dir,
+                }
+                self.logger.info("Job %d succeeded" %(job.id))
+            # Builds may bail out with SystemExit (the package manager does
+            # when yum fails), which mustn't take the worker down with them
+            except BaseException as e:
+                job.result = {
+                    "job"   : job.id,
+                    "status": "failed",
+                    "error" : str(e),
+                }
+                self.logger.error("Job %d failed: %s" %(job.id, e))
+            finally:
+                job.done.set()
+                self.queue.task_done()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+import lightbulb.profile as profile
+
+def init_subparser(subparser):
+    """
+    Configure the validate action argument parser.
+
+    Validating a profile only requires the path to the profile file.
+    """
+
+    # Path to the profile file
+    subparser.add_argument(
+      "-p",
+      "--profile",
+      help     = "build profile",
+      dest     = "profile_file",
+      required = True
+    )
+
+    return subparser
+
+class Action:
+    """
+    Validate action handler.
+
+    This parses a profile exactly as the build action would, printing our
+    interpretation of it, without touching the system. Since it needs nothing
+    system-specific, it works on any OS.
+    """
+
+    def __init__(self, arguments):
+        """
+        Run LightBulb's validate action.
+        """
+
+        self.arguments = arguments
+
+        self.profile = profile.load_file(self.arguments.profile_file)
+        print(self.profile)
@@ -5,21 +5,135 @@
 # Licensing information available at
 #   http://github.com/cloudflux/lightbulb
 
+import collections
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import http.client
+import os
+import re
+import shutil
+import subprocess
 from sys import stdout
+import threading
+import time
+import urllib.error
 import urllib.request
 
+from lightbulb.config import build as build_config
+from lightbulb.config import download as download_config
+import lightbulb.exceptions as exceptions
+from lightbulb.systemspecific import exec_elevated
+
+def run(args, logger, elevated = False, **etc):
+    """
+    Run a command, logging its output.
+
+    The command's standard output and error are merged into a single pipe,
+    which a separate thread reads from as soon as anything arrives, logging it
+    line by line at debug level. The pipe is always being drained, so the
+    command never stalls waiting for us, and its output only reaches the shell
+    if the output level asks for it.
+
+    Returns the command's exit status and its last output_tail lines of
+    output, for inclusion in any error.
+    """
+
+    name = os.path.basename(args[0])
+    tail = collections.deque(maxlen = build_config["output_tail"])
+
+    etc["bufsize"] = -1
+    etc["stdout"]  = subprocess.PIPE
+    etc["stderr"]  = subprocess.STDOUT
+
+    if elevated:
+        proc = exec_elevated(args, **etc)
+    else:
+        proc = subprocess.Popen(args, stdin = None, **etc)
+
+    def read():
+        with proc.stdout:
+            for line in proc.stdout:
+                line = line.decode("utf-8", "replace").rstrip()
+                tail.append(line)
+                logger.debug("%s: %s" %(name, line))
+
+    reader = threading.Thread(target = read)
+    reader.daemon = True
+    reader.start()
+
+    status = proc.wait()
+    reader.join()
+
+    return (status, list(tail))
+
 class Download:
     """
     """
 
     def download(source, target,
       chunk_callback = None,
-      chunk_size = 4096):
+      chunk_size = None,
+      cache = None,
+      sha256 = None,
+      cache_url = None):
         """
         Download a file.
+
+        If a source cache is supplied, it is consulted before going to the
+        network: on a hit the cached copy is written to the target and nothing
+        is downloaded at all, while on a miss the downloaded data is added to
+        the cache as it's written to the target. Returns True if the file was
+        served from the cache.
+
+        If the file's SHA-256 sum is given, it's verified as the file arrives
+        (see DownloadStream), and the cache is searched for it by that sum.
+        When downloading from a mirror, cache_url gives the URL the file should
+        be cached under, so that it's found whichever mirror it came from.
+
+        Data is read into a single reusable buffer. Unless a fixed chunk_size
+        is given, the amount we read at a time adapts to the throughput we're
+        seeing, so that fast transfers are done in a handful of large reads.
         """
 
-        chunk_id = 0
+        min_size = chunk_size or download_config["min_chunk_size"]
+        max_size = chunk_size or download_config["max_chunk_size"]
+
+        buffer = memoryview(bytearray(max_size))
+        size = min_size
+
+        with Download.open(source, (target,), chunk_callback, cache,
+          sha256, cache_url) as stream:
+            while True:
+                start = time.time()
+                count = stream.readinto(buffer[:size])
+                if not count:
+                    break
+
+                # Aim for each read to take around a tenth of a second at the
+                # rate we're currently receiving data
+                rate = count / max(time.time() - start, 0.001)
+                size = max(min_size, min(max_size, int(rate / 10)))
+
+        return stream.cached
+
+    def open(source,
+      targets = (),
+      chunk_callback = None,
+      cache = None,
+      sha256 = None,
+      cache_url = None):
+        """
+        Open a file for streaming.
+
+        Returns a DownloadStream, which can be handed to anything expecting a
+        readable file object (tarfile's stream modes, for instance) so that the
+        file can be processed while it's still being downloaded. Everything read
+        from the stream is also written to each of the targets and, on a cache
+        miss, added to the cache once the stream is finished. If the file's
+        SHA-256 sum is given, the stream verifies it. See download() for
+        cache_url.
+        """
 
         # We have to set this here because otherwise we'll get a NameError,
         # since the Download class won't be defined. I have no idea why this is,
@@ -27,18 +141,182 @@ class Download:
         if chunk_callback == None:
             chunk_callback = Download._default_download_chunk_callback
 
-        with urllib.request.urlopen(source) as file:
+        # The cache is content addressed, so anything it holds under the sum
+        # we're expecting has already been verified
+        if cache is not None:
+            cached = cache.lookup(cache_url or source, sha256)
+            if cached is not None:
+                return DownloadStream(None, targets,
+                  file = open(cached, "rb"), cached = True)
 
-            while True:
+            return DownloadStream(source, targets, chunk_callback,
+              cache.writer(cache_url or source), sha256 = sha256)
+
+        return DownloadStream(source, targets, chunk_callback,
+          sha256 = sha256)
+
+    def download_segmented(source, target_name, segments,
+      chunk_callback = None,
+      cache = None,
+      sha256 = None,
+      cache_url = None):
+        """
+        Download a file over several connections at once.
+
+        The file is split into segments byte ranges, each fetched over its own
+        connection (and retried independently) and written straight into its
+        place in the file at target_name. This helps where a single connection
+        to the server is slow. If the server doesn't say how long the file is
+        or doesn't accept range requests, or the file is too small to be worth
+        splitting, we fall back to download().
+
+        Caching and verification work as for download(), but since the
+        segments arrive out of order the finished file has to be read back
+        once to hash it. Returns True if the file was served from the cache.
+        """
+
+        if chunk_callback == None:
+            chunk_callback = Download._default_download_chunk_callback
+
+        if cache is not None:
+            cached = cache.lookup(cache_url or source, sha256)
+            if cached is not None:
+                shutil.copyfile(cached, target_name)
+                return True
+
+        # No segment is made smaller than min_segment_size, since the cost of
+        # another connection would outweigh any gain
+        length = Download._range_length(source)
+        if length is None:
+            segments = 1
+        else:
+            segments = min(segments,
+              length // download_config["min_segment_size"])
+
+        if segments < 2:
+            with open(target_name, "wb") as target:
+                return Download.download(source, target, chunk_callback,
+                  cache = cache, sha256 = sha256, cache_url = cache_url)
 
-                chunk = file.read(chunk_size)
+        # Split the file into (first byte, last byte) ranges
+        size = -(-length // segments)
+        ranges = [(start, min(start + size, length) - 1)
+          for start in range(0, length, size)]
+
+        progress = DownloadProgress(chunk_callback)
+
+        fd = os.open(target_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        try:
+            os.ftruncate(fd, length)
+
+            with ThreadPoolExecutor(max_workers = len(ranges)) as executor:
+                futures = [executor.submit(Download._download_range, source,
+                  fd, first, last, progress) for (first, last) in ranges]
+
+                for future in futures:
+                    future.result()
+        finally:
+            os.close(fd)
+
+        Download._verify(source, target_name, sha256, cache, cache_url)
+
+        return False
+
+    def _range_length(source):
+        """
+        Get the length of a file, if its server will serve ranges of it.
+
+        This is a helper method for download_segmented().
+        """
+
+        request = urllib.request.Request(source, method = "HEAD")
+
+        try:
+            with urllib.request.urlopen(request,
+              timeout = download_config["timeout"]) as response:
+                if response.headers.get("Accept-Ranges") != "bytes":
+                    return None
+
+                return int(response.headers["Content-Length"])
+        except (OSError, http.client.HTTPException, KeyError, ValueError,
+          TypeError):
+            return None
+
+    def _download_range(source, fd, first, last, progress):
+        """
+        Download a range of bytes of a file into its place in an open file.
+
+        This is a helper method for download_segmented().
+
+        Should the connection fail, we resume from where it left off, backing
+        off between attempts as DownloadStream does.
+        """
+
+        offset = first
+        attempt = 0
+
+        while offset <= last:
+            request = urllib.request.Request(source)
+            request.add_header("Range", "bytes=%d-%d" %(offset, last))
+
+            try:
+                with urllib.request.urlopen(request,
+                  timeout = download_config["timeout"]) as response:
+                    if response.status != 206:
+                        raise exceptions.DownloadError(source,
+                          "server ignored our range request")
+
+                    while offset <= last:
+                        chunk = response.read(min(last + 1 - offset,
+                          download_config["max_chunk_size"]))
+                        if not chunk:
+                            break
+
+                        os.pwrite(fd, chunk, offset)
+                        offset += len(chunk)
+                        attempt = 0
+                        progress.update(len(chunk))
+
+                if offset <= last:
+                    raise http.client.IncompleteRead(b"", last + 1 - offset)
+            except urllib.error.HTTPError as e:
+                if e.code < 500 or attempt >= download_config["retries"]:
+                    raise exceptions.DownloadError(source, e)
+            except (OSError, http.client.HTTPException) as e:
+                if attempt >= download_config["retries"]:
+                    raise exceptions.DownloadError(source, e)
+            else:
+                continue
+
+            time.sleep(download_config["backoff"] * 2 ** attempt)
+            attempt += 1
+
+    def _verify(source, file_name, sha256, cache, cache_url):
+        """
+        Hash a downloaded file, verify it and add it to the cache.
+
+        This is a helper method for download_segmented().
+        """
+
+        if cache is None:
+            writer = contextlib.nullcontext(hashlib.sha256())
+        else:
+            writer = cache.writer(cache_url or source)
+
+        # The cache writer commits the file on leaving the block, unless the
+        # sum didn't match
+        with writer as hash, open(file_name, "rb") as file:
+            update = hash.update if cache is None else hash.write
+
+            while True:
+                chunk = file.read(download_config["max_chunk_size"])
                 if not chunk:
                     break
+                update(chunk)
 
-                target.write(chunk)
-
-                chunk_callback(chunk_id, chunk_size)
-                chunk_id += 1
+            actual = hash.hexdigest()
+            if sha256 is not None and actual != sha256:
+                raise exceptions.ChecksumError(source, sha256, actual)
 
     def _default_download_chunk_callback(chunk_id, chunk_size):
         """
@@ -56,3 +334,292 @@ class Download:
         # reasons otherwise and cause some dodgy output.
         stdout.flush()
 
+class DownloadProgress:
+    """
+    Throttled download progress reporting.
+
+    The callback is only called once every progress_interval seconds, with
+    the amount of data received since it was last called. Updates may come
+    from several threads at once.
+    """
+
+    def __init__(self, callback):
+        """
+        Initialise the progress counters.
+        """
+
+        self._callback = callback
+        self._chunk_id = 0
+        self._progress = 0
+        self._time     = 0
+        self._lock     = threading.Lock()
+
+    def update(self, count):
+        """
+        Record the arrival of count bytes.
+        """
+
+        with self._lock:
+            self._progress += count
+
+            now = time.time()
+            if now - self._time >= download_config["progress_interval"]:
+                self._callback(self._chunk_id, self._progress)
+                self._chunk_id += 1
+                self._progress = 0
+                self._time = now
+
+class DownloadStream:
+    """
+    Readable stream over a file being downloaded.
+
+    Data is handed to the reader as soon as it arrives, and copied to any
+    targets (and the cache writer, if any) on the way through. Used as a
+    context manager, the stream is finished when the block exits cleanly: any
+    data the reader didn't consume is drained into the targets and the cached
+    copy is committed. If the block raises, the cached copy is discarded.
+
+    If we're given the SHA-256 sum the file should have, the data is hashed as
+    it passes through (by the cache writer, if there is one, so it's only
+    hashed once), and the sum is checked when the stream is finished. On a
+    mismatch, the cached copy is discarded and a ChecksumError raised, so a bad
+    file never makes it into the cache.
+
+    Should the connection fail or end before the whole file (according to its
+    Content-Length) has arrived, we reconnect with a Range request for the
+    remainder, backing off exponentially between attempts. The reader never
+    sees the interruption.
+    """
+
+    # Content-Range header format
+    #   For a 206 (partial content) response, this gives the first and last
+    #   bytes of the range and the length of the complete file.
+    _content_range = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+    def __init__(self, source, targets = (),
+      chunk_callback = None,
+      cache_writer = None,
+      file = None,
+      cached = False,
+      sha256 = None):
+        """
+        Initialise the stream, connecting to the source unless we've been
+        given an already open file to read from.
+        """
+
+        self.cached = cached
+        self.length = None
+        self.offset = 0
+        self.sha256 = sha256
+
+        self._source         = source
+        self._targets        = list(targets)
+        self._cache_writer   = cache_writer
+        self._progress       = None
+        self._attempt        = 0
+        self._hash           = None
+
+        if chunk_callback is not None:
+            self._progress = DownloadProgress(chunk_callback)
+
+        if cache_writer is not None:
+            self._targets.append(cache_writer)
+        elif sha256 is not None and file is None:
+            self._hash = hashlib.sha256()
+
+        if file is not None:
+            self._file = file
+        else:
+            self._file = None
+            self._reconnect(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.finish()
+        else:
+            self.close()
+
+    def readable(self):
+        return True
+
+    def read(self, size = -1):
+        """
+        Read up to size bytes from the download.
+        """
+
+        if size == 0:
+            return b""
+
+        chunk = self._read("read", size)
+        self._deliver(chunk)
+
+        return chunk
+
+    def readinto(self, buffer):
+        """
+        Read into a preallocated buffer, returning the number of bytes read.
+        """
+
+        if len(buffer) == 0:
+            return 0
+
+        count = self._read("readinto", buffer)
+        self._deliver(memoryview(buffer)[:count])
+
+        return count
+
+    def _read(self, method, arg):
+        """
+        Call one of the file's read methods, reconnecting as necessary.
+
+        This is a helper method for read() and readinto().
+        """
+
+        while True:
+            error = None
+
+            try:
+                result = getattr(self._file, method)(arg)
+            except (OSError, http.client.HTTPException) as e:
+                result = None
+                error = e
+
+            if result:
+                self._attempt = 0
+                self.offset += result if method == "readinto" else len(result)
+                return result
+
+            # A clean end of file is only the end of the download if we've got
+            # all of it; otherwise the connection was dropped under us
+            if result is not None and (self.length is None
+              or self.offset >= self.length):
+                return result
+
+            self._reconnect(error or "connection closed after %d of %d bytes"
+              %(self.offset, self.length))
+
+    def _deliver(self, chunk):
+        """
+        Pass data we've read on to the targets and the progress callback.
+        """
+
+        if not chunk:
+            return
+
+        for target in self._targets:
+            target.write(chunk)
+
+        if self._hash is not None:
+            self._hash.update(chunk)
+
+        if self._progress is not None:
+            self._progress.update(len(chunk))
+
+    def finish(self, chunk_size = 65536):
+        """
+        Read the remainder of the download, verify it and commit the cached
+        copy.
+        """
+
+        buffer = memoryview(bytearray(chunk_size))
+        while self.readinto(buffer):
+            pass
+
+        if self.sha256 is not None and not self.cached:
+            if self._cache_writer is not None:
+                actual = self._cache_writer.hexdigest()
+            else:
+                actual = self._hash.hexdigest()
+
+            if actual != self.sha256:
+                self.close()
+                raise exceptions.ChecksumError(self._source, self.sha256,
+                  actual)
+
+        if self._cache_writer is not None:
+            self._cache_writer.commit()
+            self._cache_writer = None
+
+        self._file.close()
+
+    def close(self):
+        """
+        Abandon the download, discarding the cached copy.
+        """
+
+        if self._cache_writer is not None:
+            self._cache_writer.discard()
+            self._cache_writer = None
+
+        if self._file is not None:
+            self._file.close()
+
+    def _connect(self):
+        """
+        Connect to the source, asking for everything after what we've read.
+        """
+
+        request = urllib.request.Request(self._source)
+        if self.offset:
+            request.add_header("Range", "bytes=%d-" %(self.offset))
+
+        self._file = urllib.request.urlopen(request,
+          timeout = download_config["timeout"])
+
+        if self._file.status == 206:
+            match = self._content_range.match(
+              self._file.headers.get("Content-Range", ""))
+            if not match or int(match.group(1)) != self.offset:
+                raise exceptions.DownloadError(self._source,
+                  "server returned the wrong range")
+
+            if match.group(3) != "*":
+                self.length = int(match.group(3))
+        else:
+            length = self._file.headers.get("Content-Length")
+            if length is not None:
+                self.length = int(length)
+
+            # The server ignored our Range header and is sending the whole file
+            # again, so skip over the part we've already got
+            skip = self.offset
+            while skip > 0:
+                chunk = self._file.read(min(skip, 65536))
+                if not chunk:
+                    raise http.client.IncompleteRead(b"")
+                skip -= len(chunk)
+
+    def _reconnect(self, reason):
+        """
+        (Re)connect to the source, giving up once we're out of retries.
+        """
+
+        while True:
+            # We only get here without a reason when making our first
+            # connection, which doesn't count as a retry
+            if reason is not None:
+                if (self._source is None
+                  or self._attempt >= download_config["retries"]):
+                    raise exceptions.DownloadError(self._source, reason)
+
+                time.sleep(download_config["backoff"] * 2 ** self._attempt)
+                self._attempt += 1
+
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            try:
+                self._connect()
+                return
+            except urllib.error.HTTPError as e:
+                # Client errors (missing files and the like) won't fix
+                # themselves, so there's no point trying again
+                if e.code < 500:
+                    raise exceptions.DownloadError(self._source, e)
+                reason = e
+            except (OSError, http.client.HTTPException) as e:
+                reason = e
@@ -5,14 +5,29 @@
 # Licensing information available at
 #   http://github.com/cloudflux/lightbulb
 
-from subprocess import Popen
+from functools import partial
+import hashlib
+import os
+import shutil
+import tarfile
 from tarfile import TarFile
 
 import lightbulb.apphelpers as apphelpers
+import lightbulb.cache as cache
+import lightbulb.compilercache as compilercache
+from lightbulb.config import download as download_config
+from lightbulb.config import mirrors as mirrors_config
 import lightbulb.exceptions as exceptions
-from lightbulb.systemspecific import exec_elevated, which
-from lightbulb.systemspecific.packagefilters import pkg_filter
-from lightbulb.systemspecific.packagemanagers import pkg_mgr
+import lightbulb.extract as extract
+import lightbulb.graph as graph
+import lightbulb.history as history
+import lightbulb.jobserver as jobserver
+import lightbulb.mirrors as mirrors
+import lightbulb.report as report
+import lightbulb.sourcetrees as sourcetrees
+from lightbulb.systemspecific import compiler_version, which
+from lightbulb.systemspecific.packagefilters import filter_pkgs
+from lightbulb.systemspecific.packagemanagers import get_pkg_mgr
 
 # Default paths
 #   These values are the failsafe defaults we'll use if none were specified.
@@ -79,8 +94,24 @@ modules = {
 }
 
 # The %s im this should be replaced with the version number
+#   This is the canonical URL for the source, under which it's cached; any
+#   mirrors listed in the mirrors configuration are tried alongside it.
 source_url_format = "http://nginx.org/download/nginx-%s.tar.gz"
 
+# Source archive members we don't need
+#   Anything under these directories of the source is skipped when extracting
+#   it, unless the component's profile says otherwise (see extract.extract()
+#   for the pattern syntax). contrib only holds editor plugins and scripts
+#   which play no part in the build.
+extract_exclude = ("contrib",)
+
+# Configuration files
+#   make install only installs these (into the directory of the conf path) if
+#   they don't already exist, so that the operator's changes to them survive
+#   reinstalling; the conf path itself is always one of them. Installing a
+#   cached build has to leave them alone in the same way.
+config_files = ("mime.types", "fastcgi_params")
+
 versions = (
     "0.5.38",
     "0.6.39",
@@ -97,6 +128,155 @@ versions = (
     "1.0.5",
 )
 
+# SHA-256 sums of the source archives, by version
+#   Downloads of each version are verified against its sum, and the sum is used
+#   to find the archive in the source cache. nginx.org publishes PGP signatures
+#   rather than sums, so a version's sum may only be added here once its
+#   archive has been checked against the signature.
+#
+#   @todo none have been checked yet, so for now every version is downloaded
+#         unverified (with a warning) unless the component's profile gives the
+#         sum, or require_checksums refuses to download it at all
+checksums = {}
+
+def get_configure_opts(component_profile):
+    """
+    Assemble the configure command line for a component.
+    """
+
+    opts = ["./configure"]
+
+    # Make sure we get those paths
+    for (key, value) in paths.items():
+        opts.append("%s=%s" %(
+          paths[key][0], component_profile.paths[key]))
+
+    # Disable all modules by default
+    for module in modules.items():
+        if module[1][0].startswith("--without"):
+            opts.append(module[1][0])
+
+    # Enable all user-specified modules
+    for module in component_profile.modules:
+        if modules[module][0].startswith("--without"):
+            opts.remove(modules[module][0])
+        else:
+            opts.append(modules[module][0])
+
+    return opts
+
+def artifact_key(component_profile):
+    """
+    Compute the build artifact cache key for a component.
+
+    Two builds with the same key would produce the same installed tree: same
+    version, same configure options (in any order) and same compiler. The
+    checksum the source is expected to have is included too, so that a build
+    of unverified (or differently verified) source is never installed in
+    place of one which would have been verified.
+    """
+
+    key = hashlib.sha256()
+    parts = [component_profile.application, component_profile.version,
+      str(compiler_version()), source_checksum(component_profile) or ""]
+    parts += sorted(get_configure_opts(component_profile))
+
+    for part in parts:
+        key.update(part.encode("utf-8"))
+        key.update(b"\0")
+
+    return key.hexdigest()
+
+def plan(component_profile, shared_source = False):
+    """
+    Work out which steps building a component would take, without taking them.
+
+    Returns a list of (step, status) tuples. The status is "run" for steps
+    which would have to do their work, or "cached" for those which would be
+    satisfied from one of our caches. If shared_source is set, another
+    component is building the same version and will fetch the source for us.
+    """
+
+    artifact_cache = cache.get_artifact_cache()
+    if artifact_cache is not None and artifact_cache.contains(
+      artifact_key(component_profile)):
+        return [("install-artifact", "cached")]
+
+    source_cache = cache.get_source_cache()
+    source_trees = sourcetrees.get_source_tree_store()
+    if shared_source:
+        fetch = "shared"
+    elif source_trees is not None and source_trees.contains(
+      source_tree_key(component_profile)):
+        fetch = "cached"
+    elif source_cache is not None and source_cache.contains(
+      source_url_format %(component_profile.version),
+      source_checksum(component_profile)):
+        fetch = "cached"
+    else:
+        fetch = "run"
+
+    steps = [("fetch", fetch), ("configure", "run"), ("build", "run")]
+    if artifact_cache is not None:
+        steps.append(("stage", "run"))
+    steps.append(("install", "run"))
+
+    return steps
+
+def source_urls(version):
+    """
+    Get the URLs the source for a version can be downloaded from, fastest
+    first.
+    """
+
+    url_formats = [source_url_format] + list(
+      mirrors_config["applications"].get("nginx", ()))
+
+    return [url_format %(version) for url_format
+      in mirrors.get_mirror_selector().rank("nginx", url_formats, version)]
+
+def source_checksum(component_profile):
+    """
+    Get the SHA-256 sum a component's source archive should have, or None if
+    we don't know it.
+
+    A sum given in the profile takes precedence over our own. This is looked
+    up whenever it's needed, rather than when the profile is loaded, so that
+    cached profiles pick up sums added since they were cached.
+    """
+
+    if component_profile.sha256 is not None:
+        return component_profile.sha256
+
+    return checksums.get(component_profile.version)
+
+def source_exclude(component_profile):
+    """
+    Get the members of the source archive a component doesn't extract.
+
+    As with source_checksum(), our defaults are only applied when needed.
+    """
+
+    if component_profile.extract_exclude is not None:
+        return component_profile.extract_exclude
+
+    return extract_exclude
+
+def source_tree_key(component_profile):
+    """
+    Get the key of a component's source tree in the source tree store.
+
+    Components excluding different members of the archive need different
+    trees. So do components expecting different checksums: a tree is only ever
+    populated from an archive matching the sum in its key, so a tree extracted
+    before we knew the sum (or with another sum) is never used unverified.
+    """
+
+    options = hashlib.sha256("\0".join([source_checksum(component_profile)
+      or ""] + sorted(source_exclude(component_profile))).encode("utf-8"))
+
+    return "nginx-%s-%s" %(component_profile.version, options.hexdigest()[:12])
+
 class ComponentBuilder:
     """
     nginx component builder class.
@@ -105,31 +285,126 @@ class ComponentBuilder:
     server within LightBulb.
     """
 
-    def __init__(self, component_profile, logger, work_dir):
+    def __init__(self, component_profile, logger, work_dir,
+      install_dependencies = True,
+      source_trees = None,
+      build_report = None,
+      await_dependencies = None):
         """
+        Build and install an nginx component.
+
+        If install_dependencies is False, the caller has already installed the
+        component's build dependencies (see the build action, which installs
+        those of every component in one go). Our source is checked out of the
+        given source tree store, or the shared one, so that each version is
+        only downloaded and extracted once; if both are unavailable, we fetch
+        it ourselves. Each step
+        is timed in the build report, if one is given.
+
+        If the caller is installing the dependencies in the background, it can
+        supply await_dependencies, a callable which blocks until they're in
+        place (raising if they couldn't be installed). We fetch the source in
+        the meantime, and only wait before configuring.
         """
 
-        global pkg_filter # These are imported above and are initialised in
-        global pkg_mgr    # their respective packages
-
         self._profile    = component_profile
         self._logger     = logger
         self._work_dir   = work_dir
-        self._pkg_filter = pkg_filter
-        self._pkg_mgr    = pkg_mgr
+        self._pkg_mgr    = get_pkg_mgr()
+        self._source_trees = (source_trees
+          or sourcetrees.get_source_tree_store())
+        self._report     = build_report or report.Report()
 
         self._source_url     = source_url_format %(self._profile.version)
-        self._target     = "%s/nginx-%s.tar.gz" %(self._work_dir,
-          self._profile.version)
+        self._target     = "%s/%s" %(self._work_dir,
+          os.path.basename(self._source_url))
         self._source_dir = "%s/nginx-%s" %(self._work_dir,
           self._profile.version)
+        self._stage_dir  = "%s/stage" %(self._work_dir)
+
+        self._env = dict(os.environ)
+        self._compiler_cache = compilercache.get_compiler_cache(
+          self._profile.build_options)
+        if self._compiler_cache is not None:
+            self._env = self._compiler_cache.env(self._env)
+
+        self._artifact_cache = cache.get_artifact_cache()
+        if self._artifact_cache is not None:
+            self._artifact_key = artifact_key(self._profile)
+            self._artifact = self._artifact_cache.get(self._artifact_key)
+        else:
+            self._artifact = None
+
+        # Installing dependencies and fetching the source are independent,
+        # and both spend most of their time waiting on I/O, so they run side
+        # by side; configuring needs both to have finished
+        steps = graph.TaskGraph()
+        requires = []
+
+        if install_dependencies:
+            steps.add("dependencies",
+              partial(self._step, "dependencies", self._install_dependencies))
+            requires.append("dependencies")
+        elif await_dependencies is not None:
+            steps.add("dependencies",
+              partial(self._await_dependencies, await_dependencies))
+            requires.append("dependencies")
+
+        if self._artifact is not None:
+            self._logger.info("Found cached build of nginx")
+            steps.add("install-artifact",
+              partial(self._step, "install-artifact", self._install_artifact))
+        else:
+            if self._source_trees is not None:
+                steps.add("fetch", partial(self._step, "fetch",
+                  self._checkout))
+            else:
+                steps.add("fetch", partial(self._step, "fetch", self._fetch,
+                  self._work_dir))
+
+            steps.add("configure", partial(self._step, "configure",
+              self._configure), ["fetch"] + requires)
+            steps.add("build", partial(self._step, "build", self._build),
+              ["configure"])
+            steps.add("stage", partial(self._step, "stage", self._stage),
+              ["build"])
+            steps.add("install", partial(self._step, "install",
+              self._install), ["stage"])
+
+        # Registering with the job budget while we build entitles us to our
+        # share of its compiler jobs, rather than all of them
+        with jobserver.get_budget().building():
+            steps.run(2)
+
+    def _step(self, name, method, *args):
+        """
+        Run a build step, timing it in the build report and history.
+
+        Only steps which complete are recorded in the history, so that
+        failures don't skew the estimates made when planning builds. Steps
+        return True if one of our caches did their work for them, and are
+        then recorded as "<step>-cached", so that the time a cache saves us
+        doesn't get averaged into the estimate for when it can't.
+        """
+
+        with self._report.span(name) as span:
+            cached = method(*args)
+
+        if cached:
+            name = "%s-cached" %(name)
 
-        self._install_dependencies()
-        self._download()
-        self._extract()
-        self._configure()
-        self._build()
-        self._install()
+        build_history = history.get_history()
+        if build_history is not None:
+            build_history.record("nginx/%s/%s" %(self._profile.version, name),
+              span["duration"])
+
+    def _await_dependencies(self, await_dependencies):
+        """
+        Wait for the caller to finish installing our dependencies.
+        """
+
+        with self._report.span("dependencies-wait"):
+            await_dependencies()
 
     def _install_dependencies(self):
         """
@@ -137,23 +412,118 @@ class ComponentBuilder:
 
         self._logger.info("Installing nginx build dependencies")
 
-        deps = []
-        for dep in self._profile.dependencies:
-            deps.append(self._pkg_filter[dep])
-
-        self._pkg_mgr.install_pkgs(deps)
+        self._pkg_mgr.install_pkgs(filter_pkgs(self._profile.dependencies))
 
         self._logger.info("Finished installing nginx build dependencies")
 
-    def _download(self):
+    def _fetch(self, directory):
+        """
+        Download the source code and extract it into a directory.
+
+        If the source isn't in the source cache, we try each of the mirrors
+        in turn, fastest first, until one succeeds. Segmented downloads need
+        the whole archive on disk to write the segments into, so they can't be
+        streamed.
+
+        Returns True if the source cache held the archive.
+        """
+
+        sha256 = self._checksum()
+
+        source_cache = cache.get_source_cache()
+        if source_cache is not None and source_cache.contains(
+          self._source_url, sha256):
+            urls = [self._source_url]
+        else:
+            urls = source_urls(self._profile.version)
+
+        for (i, url) in enumerate(urls):
+            try:
+                if (download_config["stream"]
+                  and download_config["segments"] < 2):
+                    return self._stream(directory, url, sha256)
+
+                cached = self._download(url, sha256)
+                self._extract(directory)
+
+                return cached
+            except (exceptions.DownloadError, exceptions.ChecksumError) as e:
+                if i == len(urls) - 1:
+                    raise
+
+                self._logger.warning("%s; trying the next mirror" %(e))
+
+                # A failed stream may have left a partial tree behind
+                shutil.rmtree("%s/nginx-%s" %(directory,
+                  self._profile.version), ignore_errors = True)
+
+    def _checkout(self):
         """
-        @todo verification though MD5, SHA1 or PGP sums
+        Check the source code out of the source tree store.
+
+        Returns True if the store held the tree, or the source cache held the
+        archive to populate it with.
         """
 
-        self._logger.info("Downloading nginx source code")
+        name = "nginx-%s" %(self._profile.version)
+        fetched = []
 
-        with open(self._target, "wb") as t:
-            apphelpers.Download.download(self._source_url, t)
+        if self._source_trees.checkout(source_tree_key(self._profile),
+          lambda directory: fetched.append(self._fetch(directory)), name,
+          self._work_dir):
+            self._logger.info("Cloned stored nginx source tree")
+            return True
+
+        return fetched[0]
+
+    def _checksum(self):
+        """
+        Get the SHA-256 sum our source archive should have.
+
+        This is a helper method for _fetch().
+        """
+
+        sha256 = source_checksum(self._profile)
+
+        if sha256 is None:
+            if download_config["require_checksums"]:
+                raise exceptions.DownloadError(self._source_url,
+                  "no checksum is known for nginx %s" %(self._profile.version))
+
+            self._logger.warning("No checksum is known for nginx %s; its "
+              %(self._profile.version) + "source code won't be verified")
+
+        return sha256
+
+    def _download(self, url, sha256):
+        """
+        Download the source code archive into the working directory.
+
+        The archive is verified as it downloads (or, for segmented downloads,
+        once it's complete), so a bad archive is rejected before we extract it.
+        Returns True if the source cache held the archive.
+        """
+
+        self._logger.info("Downloading nginx source code from %s" %(url))
+
+        with self._report.span("download", url = url) as span:
+            if download_config["segments"] > 1:
+                cached = apphelpers.Download.download_segmented(url,
+                  self._target, download_config["segments"],
+                  cache = cache.get_source_cache(), sha256 = sha256,
+                  cache_url = self._source_url)
+            else:
+                with open(self._target, "wb") as t:
+                    cached = apphelpers.Download.download(url, t,
+                      cache = cache.get_source_cache(), sha256 = sha256,
+                      cache_url = self._source_url)
+
+            span["bytes"]  = os.path.getsize(self._target)
+            span["cached"] = cached
+
+        if cached:
+            self._logger.info("Used cached copy of nginx source code")
+            return True
 
         # Since our download dotter method doesn't output a new line on its
         # final run (it can't, it has no way of knowing it's being called for
@@ -162,50 +532,77 @@ class ComponentBuilder:
 
         self._logger.info("Finished downloading nginx source code")
 
-    def _extract(self):
+        return False
+
+    def _extract(self, directory):
         """
         """
 
         self._logger.info("Extracting nginx source code")
 
-        source = TarFile.open(self._target, "r|gz")
-        source.extractall(self._work_dir)
+        with self._report.span("extract"):
+            extract.extract(self._target, directory,
+              exclude = source_exclude(self._profile))
 
         self._logger.info("Finished extracting nginx source code")
 
-    def _configure(self):
+    def _stream(self, directory, url, sha256):
         """
+        Download and extract the source code in a single pass.
+
+        The archive is handed to tarfile's stream reader as it arrives, so
+        extraction is already under way by the time the download completes.
+        The archive itself is only written to the source cache, never to the
+        working directory.
+
+        The archive can only be verified once it's been read in full, by which
+        time it's been extracted. If it's bad, the error leaves the extracted
+        tree behind in the directory, so it mustn't be used (the source tree
+        store discards it) and the archive isn't cached. Returns True if the
+        source cache held the archive.
         """
 
-        self._logger.info("Configuring nginx for compilation")
+        self._logger.info("Downloading and extracting nginx source code from "
+          + url)
 
-        configure_opts = ["./configure"]
+        # Downloading and extracting overlap, so they share a single span
+        with self._report.span("download-extract", url = url) as span:
+            with apphelpers.Download.open(url,
+              cache = cache.get_source_cache(), sha256 = sha256,
+              cache_url = self._source_url) as stream:
+                extract.extract(stream, directory,
+                  extract.compression(url),
+                  exclude = source_exclude(self._profile))
 
-        # Make sure we get those paths
-        for (key, value) in paths.items():
-            configure_opts.append("%s=%s" %(
-              paths[key][0], self._profile.paths[key]))
-
-        # Disable all modules by default
-        for module in modules.items():
-            if module[1][0].startswith("--without"):
-                configure_opts.append(module[1][0])
-
-        # Enable all user-specified modules
-        for module in self._profile.modules:
-            if modules[module][0].startswith("--without"):
-                configure_opts.remove(modules[module][0])
-            else:
-                configure_opts.append(modules[module][0])
+            span["bytes"]  = stream.offset
+            span["cached"] = stream.cached
 
+        if stream.cached:
+            self._logger.info("Used cached copy of nginx source code")
+        else:
+            # See _download() for why this is necessary
+            print("")
+
+        self._logger.info("Finished downloading and extracting nginx source "
+          + "code")
+
+        return stream.cached
+
+    def _configure(self):
+        """
+        """
+
+        self._logger.info("Configuring nginx for compilation")
+
+        configure_opts = get_configure_opts(self._profile)
         configure_line = " ".join(configure_opts)
 
         self._logger.info("Using configure line:\n%s" %(configure_line))
 
-        proc = Popen(configure_opts, bufsize = -1, stdin = None,
-          cwd = self._source_dir)
-        if proc.wait() > 0:
-            raise exceptions.ApplicationBuildError("Configure failed")
+        (status, output) = apphelpers.run(configure_opts, self._logger,
+          cwd = self._source_dir, env = self._env)
+        if status > 0:
+            raise exceptions.ApplicationBuildError("Configure failed", output)
 
         self._logger.info("Finished configuring nginx for compilation")
 
@@ -213,24 +610,159 @@ class ComponentBuilder:
         """
         """
 
-        self._logger.info("Compiling nginx source code")
+        if self._compiler_cache is not None:
+            stats = self._compiler_cache.stats(self._env)
+
+        # Take our share of the machine's compiler jobs for the duration of the
+        # build, so concurrent component builds don't oversubscribe it
+        with jobserver.get_budget().jobs(
+          self._profile.build_options.get("jobs")) as jobs:
+            self._logger.info("Compiling nginx source code (%d jobs)" %(jobs))
 
-        proc = Popen(["make"], bufsize = -1, stdin = None,
-          cwd = self._source_dir)
-        if proc.wait() > 0:
-            raise exceptions.ApplicationBuildError("Compilation failed")
+            (status, output) = apphelpers.run(["make", "-j%d" %(jobs)],
+              self._logger, cwd = self._source_dir, env = self._env)
+            if status > 0:
+                raise exceptions.ApplicationBuildError("Compilation failed",
+                  output)
+
+        # The counters are shared by everything using the same cache, so these
+        # figures include any other builds compiling at the same time
+        if self._compiler_cache is not None:
+            (hits, misses) = self._compiler_cache.stats(self._env)
+            self._logger.info("Compiler cache: %d hits, %d misses" %(
+              hits - stats[0], misses - stats[1]))
 
         self._logger.info("Finished compiling nginx source code")
 
+    def _stage(self):
+        """
+        Stage the installation and archive it in the build artifact cache.
+
+        The staged tree is produced by an unprivileged make install into a
+        DESTDIR within the working directory. Failure to stage isn't fatal;
+        the build simply won't be cached.
+
+        The staged tree also holds every parent directory of the prefix (usr,
+        usr/local, for instance), created with whatever mode our umask gave
+        them. Unpacking those would change the modes of the real directories,
+        so they're left out of the archive; only directories within the prefix,
+        and empty ones make install created elsewhere, are archived.
+        """
+
+        if self._artifact_cache is None:
+            return
+
+        self._logger.info("Staging nginx installation for the build cache")
+
+        (status, output) = apphelpers.run(["make", "install",
+          "DESTDIR=%s" %(self._stage_dir)], self._logger,
+          cwd = self._source_dir, env = self._env)
+        if status > 0:
+            self._logger.warning("Staging failed; this build won't be cached")
+            return
+
+        (fd, temp_name) = self._artifact_cache.mkstemp()
+        try:
+            with os.fdopen(fd, "wb") as file:
+                self._archive_stage(file)
+        except (OSError, tarfile.TarError) as e:
+            self._logger.warning("Couldn't archive the staged installation; "
+              + "this build won't be cached: %s" %(e))
+
+            try:
+                os.unlink(temp_name)
+            except OSError:
+                pass
+
+            return
+
+        self._artifact_cache.put(self._artifact_key, temp_name)
+
+        self._logger.info("Finished staging nginx installation")
+
+    def _archive_stage(self, file):
+        """
+        Archive the staged installation into a file.
+
+        This is a helper method for _stage().
+        """
+
+        prefix = self._profile.paths["prefix"].rstrip("/")
+
+        with TarFile.open(fileobj = file, mode = "w|gz") as artifact:
+            for (parent, dirs, files) in os.walk(self._stage_dir):
+                dirs.sort()
+                name = os.path.relpath(parent, self._stage_dir)
+
+                if name != "." and (("/%s/" %(name)).startswith(prefix + "/")
+                  or not (dirs or files)):
+                    artifact.add(parent, arcname = name, recursive = False)
+
+                # Symbolic links to directories aren't walked, so they're
+                # archived along with the files
+                for entry in sorted(dirs + files):
+                    path = "%s/%s" %(parent, entry)
+                    if os.path.isdir(path) and not os.path.islink(path):
+                        continue
+
+                    artifact.add(path, arcname = os.path.normpath(
+                      "%s/%s" %(name, entry)), recursive = False)
+
+    def _install_artifact(self):
+        """
+        Install a cached build by unpacking it over the filesystem root.
+
+        This step is always satisfied from the cache, so returns True.
+
+        Directories which already exist keep their ownership and modes; older
+        artifacts hold the parent directories of the prefix too. As with make
+        install, configuration files (see config_files) are only installed if
+        they don't already exist, so we unpack everything else first and then
+        those, skipping any already in place.
+        """
+
+        self._logger.info("Installing nginx from the build cache")
+
+        conf_dir = os.path.dirname(self._profile.paths["conf"])
+        protected = set(path.lstrip("/") for path in [self._profile.paths[
+          "conf"]] + ["%s/%s" %(conf_dir, name) for name in config_files])
+
+        with TarFile.open(self._artifact, "r:gz") as artifact:
+            protected &= set(artifact.getnames())
+        protected = sorted(protected)
+
+        tar = [which("tar"), "--no-same-owner", "-xzf", self._artifact, "-C",
+          "/"]
+
+        (status, output) = apphelpers.run(tar + ["--no-overwrite-dir",
+          "--anchored", "--no-wildcards"] + ["--exclude=%s" %(path)
+          for path in protected], self._logger, elevated = True)
+
+        # Skipping existing files implies skipping existing directories
+        if status == 0 and protected:
+            (status, output) = apphelpers.run(tar + ["--skip-old-files",
+              "--no-wildcards", "--"] + protected, self._logger,
+              elevated = True)
+
+        if status > 0:
+            raise exceptions.ApplicationBuildError("Installation failed",
+              output)
+
+        self._logger.info("Finished installing nginx")
+
+        return True
+
     def _install(self):
         """
         """
 
         self._logger.info("Installing nginx")
 
-        proc = exec_elevated([which("make"), "install"], cwd = self._source_dir)
-        if proc.wait() > 0:
-            raise exceptions.ApplicationBuildError("Installation failed")
+        (status, output) = apphelpers.run([which("make"), "install"],
+          self._logger, elevated = True, cwd = self._source_dir)
+        if status > 0:
+            raise exceptions.ApplicationBuildError("Installation failed",
+              output)
 
         self._logger.info("Finished installing nginx")
 
@@ -243,12 +775,15 @@ class ComponentProfile:
     """
 
     # The values we export
-    application  = "nginx"
-    version      = ""
-    paths        = {}
-    auth_cred    = {}
-    modules      = []
-    dependencies = []
+    #   Everything but the application name is specific to each instance, so
+    #   they're declared as slots rather than defaults on the class (which
+    #   every instance would end up sharing, and appending to). This also keeps
+    #   instances compact when loading many profiles into one process.
+    __slots__ = ("raw", "name", "requires", "version", "paths", "auth_cred",
+      "modules", "dependencies", "build_options", "extract_exclude",
+      "sha256")
+
+    application = "nginx"
 
     def __init__(self, dict):
         """
@@ -263,10 +798,23 @@ class ComponentProfile:
         """
 
         self.raw = dict
+        self.paths = {}
+        self.auth_cred = {}
+        self.modules = []
+        self.dependencies = []
+        self._init_name()
         self._init_version()
         self._init_paths()
         self._init_modules()
         self._init_dependencies()
+        self._init_build_options()
+        self._init_extract_options()
+
+        # Nothing should modify the profile once it's been interpreted, and we
+        # no longer need the raw dictionary
+        self.modules = tuple(self.modules)
+        self.dependencies = tuple(self.dependencies)
+        del(self.raw)
 
     def __str__(self):
         """
@@ -279,7 +827,22 @@ class ComponentProfile:
         dependencies = "\n".join("* %s" %(value) for value in self.dependencies)
 
         return "Application: %s\n\nPaths:\n%s\n\nModules:\n%s\n\nDependencies:\n%s" %(
-          self.raw["application"], paths, modules, dependencies)
+          self.application, paths, modules, dependencies)
+
+    def _init_name(self):
+        """
+        Initialise the component's name and ordering dependencies.
+
+        This is a helper method for __init__().
+
+        Components are identified by their application name unless the profile
+        gives them another (see Profile._init_component_names() for unnamed
+        components of the same application). Any components named in the
+        requires list will be built before this one.
+        """
+
+        self.name = self.raw.get("name", self.application)
+        self.requires = tuple(self.raw.get("requires", ()))
 
     def _init_version(self):
         """
@@ -289,7 +852,9 @@ class ComponentProfile:
 
         Get the version number from the profile file and ensure we're actually
         able to build this version. If it's not within our versions dictionary,
-        we'll raise an error and bail out early.
+        we'll raise an error and bail out early. We also note the SHA-256 sum
+        its source archive should have, if the profile gives one (see
+        source_checksum()).
         """
 
         if self.raw["version"] not in versions:
@@ -297,6 +862,9 @@ class ComponentProfile:
               self.raw["application"], self.raw["version"])
 
         self.version = self.raw["version"]
+        self.sha256 = self.raw.get("sha256")
+        if self.sha256 is not None:
+            self.sha256 = str(self.sha256).lower()
 
     def _init_paths(self):
         """
@@ -344,11 +912,41 @@ class ComponentProfile:
         This is a helper method for __init__().
         """
 
-        self.dependencies.extend(["gcc", "make"])
+        deps = ["gcc", "make"]
 
         for module in self.modules:
             try:
-                self.dependencies.extend(modules[module][1])
+                deps.extend(modules[module][1])
             except IndexError:
                 pass
 
+        for dep in deps:
+            if dep not in self.dependencies:
+                self.dependencies.append(dep)
+
+    def _init_build_options(self):
+        """
+        Initialise build options.
+
+        This is a helper method for __init__().
+
+        The build section of a component allows its compilation to be tuned;
+        for instance, jobs caps the number of parallel make jobs it will use.
+        """
+
+        self.build_options = dict(self.raw.get("build", {}))
+
+    def _init_extract_options(self):
+        """
+        Initialise source extraction options.
+
+        This is a helper method for __init__().
+
+        The extract section of a component may list the members of the source
+        archive to exclude, replacing our defaults; an empty list extracts
+        everything. If it doesn't, this is None (see source_exclude()).
+        """
+
+        self.extract_exclude = self.raw.get("extract", {}).get("exclude")
+        if self.extract_exclude is not None:
+            self.extract_exclude = tuple(self.extract_exclude)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+import hashlib
+import os
+import tempfile
+import threading
+
+from lightbulb.config import artifact_cache as artifact_cache_config
+from lightbulb.config import source_cache as source_cache_config
+
+class Cache:
+    """
+    Size-capped on-disk file store with least recently used eviction.
+
+    Entries are plain files named after their (hex digest) keys, kept within a
+    single directory. Every time an entry is used we bump its modification
+    time, so that when the store grows beyond its size cap we can simply
+    discard the entries with the oldest modification times first.
+    """
+
+    def __init__(self, directory, max_size):
+        """
+        Initialise the store, creating its directory if necessary.
+        """
+
+        self.directory = os.path.expanduser(directory)
+        self.max_size  = max_size
+        self._lock     = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok = True)
+
+    def path(self, key):
+        """
+        Get the path an entry is (or would be) stored at.
+        """
+
+        return "%s/%s" %(self.directory, key)
+
+    def get(self, key):
+        """
+        Get the path to an entry, or None if it isn't present.
+
+        Fetching an entry marks it as recently used.
+        """
+
+        path = self.path(key)
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+
+        return path
+
+    def contains(self, key):
+        """
+        Determine whether an entry is present, without marking it as used.
+        """
+
+        return os.path.exists(self.path(key))
+
+    def put(self, key, file_name):
+        """
+        Move a complete file into the store as the given entry.
+
+        The file should reside on the same filesystem as the store, so that
+        the rename is atomic and readers never see a partially written entry.
+        """
+
+        path = self.path(key)
+
+        with self._lock:
+            os.rename(file_name, path)
+            os.utime(path, None)
+            self._evict(path)
+
+        return path
+
+    def mkstemp(self):
+        """
+        Create a temporary file alongside the entries.
+        """
+
+        return tempfile.mkstemp(prefix = ".", suffix = ".part",
+          dir = self.directory)
+
+    def _evict(self, keep = None):
+        """
+        Discard least recently used entries until we're within our size cap.
+        """
+
+        entries = []
+        total = 0
+
+        for name in os.listdir(self.directory):
+            if name.startswith("."):
+                continue
+
+            path = self.path(name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+
+        for (mtime, size, path) in entries:
+            if total <= self.max_size:
+                break
+
+            if path == keep:
+                continue
+
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+class SourceCache:
+    """
+    Content-addressed store of downloaded source archives.
+
+    Archives are stored by the SHA-256 sum of their contents, and an index maps
+    the URLs we fetched them from to those sums. Where the expected sum of an
+    archive is already known it can be looked up directly, regardless of which
+    URL it was originally retrieved from.
+    """
+
+    def __init__(self, directory, max_size):
+        """
+        Initialise the object store and URL index.
+        """
+
+        directory = os.path.expanduser(directory)
+
+        self.objects   = Cache("%s/objects" %(directory), max_size)
+        self.index_dir = "%s/urls" %(directory)
+
+        os.makedirs(self.index_dir, exist_ok = True)
+
+    def lookup(self, url, sha256 = None):
+        """
+        Find a cached copy of an archive.
+
+        Returns the path to the cached archive, or None on a cache miss.
+        """
+
+        if sha256 is None:
+            sha256 = self._read_index(url)
+            if sha256 is None:
+                return None
+
+        return self.objects.get(sha256)
+
+    def contains(self, url, sha256 = None):
+        """
+        Determine whether an archive is cached, without marking it as used.
+        """
+
+        if sha256 is None:
+            sha256 = self._read_index(url)
+            if sha256 is None:
+                return False
+
+        return self.objects.contains(sha256)
+
+    def writer(self, url):
+        """
+        Get a file-like object which adds an archive to the cache.
+        """
+
+        return SourceCacheWriter(self, url)
+
+    def _index_path(self, url):
+        """
+        Get the path of a URL's index entry.
+        """
+
+        return "%s/%s" %(self.index_dir,
+          hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def _read_index(self, url):
+        """
+        Get the SHA-256 sum of the archive last retrieved from a URL.
+        """
+
+        try:
+            with open(self._index_path(url)) as file:
+                return file.read().strip()
+        except IOError:
+            return None
+
+    def _write_index(self, url, sha256):
+        """
+        Record the SHA-256 sum of the archive retrieved from a URL.
+        """
+
+        (fd, temp_name) = tempfile.mkstemp(dir = self.index_dir)
+        with os.fdopen(fd, "w") as file:
+            file.write(sha256)
+
+        os.rename(temp_name, self._index_path(url))
+
+class SourceCacheWriter:
+    """
+    Source cache writer.
+
+    Data written to this object is hashed as it arrives and spooled into a
+    temporary file within the cache. Once the download completes the file is
+    committed to the cache under its SHA-256 sum; if it fails, the partial file
+    is discarded.
+    """
+
+    def __init__(self, cache, url):
+        """
+        Open the temporary file.
+        """
+
+        self._cache = cache
+        self._url   = url
+        self._hash  = hashlib.sha256()
+
+        (fd, self._temp_name) = cache.objects.mkstemp()
+        self._file = os.fdopen(fd, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def write(self, data):
+        """
+        Append data to the archive.
+        """
+
+        self._hash.update(data)
+        self._file.write(data)
+
+    def hexdigest(self):
+        """
+        Get the SHA-256 sum of the data written so far.
+        """
+
+        return self._hash.hexdigest()
+
+    def commit(self):
+        """
+        Add the completed archive to the cache and return its SHA-256 sum.
+        """
+
+        self._file.close()
+
+        sha256 = self._hash.hexdigest()
+        self._cache.objects.put(sha256, self._temp_name)
+        self._cache._write_index(self._url, sha256)
+
+        return sha256
+
+    def discard(self):
+        """
+        Throw away the partially written archive.
+        """
+
+        self._file.close()
+
+        try:
+            os.unlink(self._temp_name)
+        except OSError:
+            pass
+
+_source_cache = None
+_source_cache_lock = threading.Lock()
+
+def get_source_cache():
+    """
+    Get the shared source cache, or None if it has been disabled.
+    """
+
+    global _source_cache
+
+    if not source_cache_config["enabled"]:
+        return None
+
+    with _source_cache_lock:
+        if _source_cache is None:
+            _source_cache = SourceCache(source_cache_config["directory"],
+              source_cache_config["max_size"])
+
+    return _source_cache
+
+_artifact_cache = None
+_artifact_cache_lock = threading.Lock()
+
+def get_artifact_cache():
+    """
+    Get the shared build artifact cache, or None if it has been disabled.
+    """
+
+    global _artifact_cache
+
+    if not artifact_cache_config["enabled"]:
+        return None
+
+    with _artifact_cache_lock:
+        if _artifact_cache is None:
+            _artifact_cache = Cache(artifact_cache_config["directory"],
+              artifact_cache_config["max_size"])
+
+    return _artifact_cache
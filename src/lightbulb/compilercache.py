@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+import os
+import subprocess
+
+from lightbulb.config import compiler_cache as compiler_cache_config
+from lightbulb.systemspecific import which
+
+class CompilerCache:
+    """
+    ccache interface.
+
+    Routing compilation through ccache means translation units which haven't
+    changed between builds (most of them, when only a module or two has been
+    toggled) are served from the cache rather than recompiled.
+    """
+
+    def __init__(self, launcher, directory = None, max_size = None):
+        """
+        Initialise the cache settings.
+        """
+
+        self.launcher  = launcher
+        self.directory = directory
+        self.max_size  = max_size
+
+    def env(self, env, cc = "cc"):
+        """
+        Set up a build environment to compile through the cache.
+        """
+
+        env = dict(env)
+        env["CC"] = "%s %s" %(self.launcher, env.get("CC", cc))
+
+        if self.directory:
+            env["CCACHE_DIR"] = self.directory
+        if self.max_size:
+            env["CCACHE_MAXSIZE"] = str(self.max_size)
+
+        return env
+
+    def stats(self, env):
+        """
+        Get the cache's cumulative (hits, misses) counts.
+
+        Newer versions of ccache have machine-readable statistics; for older
+        ones we pick the numbers out of the human-readable summary.
+        """
+
+        hits = 0
+        misses = 0
+
+        proc = subprocess.Popen([self.launcher, "--print-stats"], env = env,
+          stdout = subprocess.PIPE, stderr = subprocess.DEVNULL,
+          universal_newlines = True)
+        (output, errors) = proc.communicate()
+
+        if proc.returncode == 0:
+            for line in output.split("\n"):
+                (key, sep, value) = line.partition("\t")
+                if key in ("direct_cache_hit", "preprocessed_cache_hit"):
+                    hits += int(value)
+                elif key == "cache_miss":
+                    misses += int(value)
+
+            return (hits, misses)
+
+        proc = subprocess.Popen([self.launcher, "-s"], env = env,
+          stdout = subprocess.PIPE, stderr = subprocess.DEVNULL,
+          universal_newlines = True)
+        (output, errors) = proc.communicate()
+
+        for line in output.split("\n"):
+            fields = line.rsplit(None, 1)
+            if len(fields) != 2 or not fields[1].isdigit():
+                continue
+
+            if fields[0].startswith("cache hit ("):
+                hits += int(fields[1])
+            elif fields[0] == "cache miss":
+                misses += int(fields[1])
+
+        return (hits, misses)
+
+def get_compiler_cache(build_options = {}):
+    """
+    Get the compiler cache to use for a component, if any.
+
+    A component's build options may enable or disable the cache (with the
+    ccache key) regardless of the global setting. None is returned if the
+    cache is disabled or its launcher can't be found.
+    """
+
+    if not build_options.get("ccache", compiler_cache_config["enabled"]):
+        return None
+
+    launcher = compiler_cache_config["launcher"]
+    if not os.path.isabs(launcher):
+        launcher = which(launcher)
+
+    if launcher is None or not os.path.isfile(launcher):
+        return None
+
+    return CompilerCache(launcher, compiler_cache_config["directory"],
+      compiler_cache_config["max_size"])
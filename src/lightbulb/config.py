@@ -9,3 +9,144 @@ permission_elevation = {
     "method": "elevator",
     "elevator": "/usr/local/elevator/bin/elevator",
 }
+
+# Source cache
+#   Downloaded source archives are kept here between builds, so rebuilding the
+#   same version of an application doesn't mean going back to the network. Once
+#   the cache grows beyond max_size bytes, the least recently used archives are
+#   discarded.
+source_cache = {
+    "enabled"  : True,
+    "directory": "~/.lightbulb/cache/sources",
+    "max_size" : 1024 * 1024 * 1024,
+}
+
+# Downloads
+#   When stream is enabled, source archives are extracted as they download
+#   rather than being written out in full and then read back. Failed or
+#   truncated downloads are resumed up to retries times, waiting backoff
+#   seconds before the first retry and doubling the wait each time after.
+#   Reads grow from min_chunk_size to max_chunk_size bytes as throughput
+#   allows, and progress is reported at most once every progress_interval
+#   seconds.
+#
+#   Downloads are verified against the SHA-256 sums listed by each application
+#   (or given in the profile). Versions without one are downloaded unverified,
+#   with a warning, unless require_checksums is set.
+#
+#   If segments is greater than 1, archives are instead downloaded in full over
+#   that many connections at once, each fetching a different range of bytes,
+#   where the server allows it. No segment is made smaller than
+#   min_segment_size bytes.
+download = {
+    "stream"           : True,
+    "require_checksums": False,
+    "retries"          : 5,
+    "backoff"          : 1.0,
+    "timeout"          : 60,
+    "min_chunk_size"   : 64 * 1024,
+    "max_chunk_size"   : 4 * 1024 * 1024,
+    "progress_interval": 0.5,
+    "segments"         : 1,
+    "min_segment_size" : 1024 * 1024,
+}
+
+# Mirrors
+#   Source archives may be downloaded from any of the mirrors listed for their
+#   application here, as URL formats taking the version like the application's
+#   own (e.g. "http://mirror.example.com/nginx/nginx-%s.tar.gz"). Where there's
+#   a choice, every mirror is probed at once by timing a download of its first
+#   probe_size bytes, and the fastest is used, falling back to the others in
+#   order of speed should it fail. The choice is remembered in the file at path
+#   for ttl seconds.
+mirrors = {
+    "applications" : {},
+    "probe_size"   : 256 * 1024,
+    "probe_timeout": 10,
+    "ttl"          : 24 * 60 * 60,
+    "path"         : "~/.lightbulb/mirrors.json",
+}
+
+# Compilation
+#   jobs is the total number of compiler jobs we'll run at once across all of
+#   the components being built. If it's None, we size it from the number of
+#   CPUs available and the amount of free memory, allowing mem_per_job bytes
+#   for each job.
+#
+#   The output of configure, make and friends is logged at debug level, and
+#   the last output_tail lines of it are included in the error if they fail.
+build = {
+    "jobs"       : None,
+    "mem_per_job": 512 * 1024 * 1024,
+    "output_tail": 20,
+}
+
+# Build artifact cache
+#   After a successful build, the installed tree is archived here under a key
+#   derived from the application version, configure options and compiler
+#   version. Later builds with the same key install the archive instead of
+#   downloading, configuring and compiling again.
+artifact_cache = {
+    "enabled"  : True,
+    "directory": "~/.lightbulb/cache/artifacts",
+    "max_size" : 2 * 1024 * 1024 * 1024,
+}
+
+# Compiler cache
+#   If enabled (globally here, or per component with the ccache build option),
+#   compilation is routed through ccache. directory and max_size override
+#   ccache's own defaults for its cache location and size limit (e.g. "5G").
+compiler_cache = {
+    "enabled"  : False,
+    "launcher" : "ccache",
+    "directory": None,
+    "max_size" : None,
+}
+
+# Profile cache
+#   Parsed profiles are kept here, so that loading a profile which hasn't
+#   changed since it was last used doesn't require parsing it again.
+profile_cache = {
+    "enabled"  : True,
+    "directory": "~/.lightbulb/cache/profiles",
+}
+
+# Build history
+#   We keep the last max_records durations of each build step, and use them
+#   to estimate how long planned builds will take.
+history = {
+    "enabled"    : True,
+    "path"       : "~/.lightbulb/history.json",
+    "max_records": 10,
+}
+
+# Build reports
+#   Every build writes a JSON report of its timings and resource usage to
+#   report.json in its working directory, and appends it to the file at path
+#   so that performance can be tracked from one build to the next.
+report = {
+    "enabled": True,
+    "path"   : "~/.lightbulb/reports.jsonl",
+}
+
+# Source tree store
+#   Each version of an application's source is extracted here once, and every
+#   build clones its source tree from here rather than extracting it again.
+source_trees = {
+    "enabled"  : True,
+    "directory": "~/.lightbulb/cache/trees",
+}
+
+# Source archive extraction
+#   Where one of these tools is installed, it decompresses archives for us
+#   (using several threads, where it can) while we unpack the tar stream it
+#   produces. Otherwise, we decompress them ourselves. The first tool found for
+#   each compression format is used.
+extract = {
+    "tools": {
+        "gz" : (("pigz", "-dc"),),
+        "bz2": (("lbzip2", "-dc"), ("pbzip2", "-dc")),
+        "xz" : (("xz", "-dc", "-T0"),),
+    },
+    "chunk_size": 1024 * 1024,
+}
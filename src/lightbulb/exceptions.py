@@ -54,10 +54,29 @@ class ApplicationBuildError(Exception):
     Application build error.
 
     If an application fails to build for whatever reason, this catch-all
-    error should be raised.
+    error should be raised. Where the failure was that of a command, its last
+    few lines of output should be supplied, since they'll usually explain it.
     """
 
-    pass
+    def __init__(self, message, output = ()):
+        """
+        Initialise error information values.
+        """
+
+        Exception.__init__(self, message)
+
+        self.message = message
+        self.output = list(output)
+
+    def __str__(self):
+        """
+        Return a string representation.
+        """
+
+        if not self.output:
+            return self.message
+
+        return "%s; last output:\n%s" %(self.message, "\n".join(self.output))
 
 class UnsupportedApplicationVersionError(Exception):
     """
@@ -83,3 +102,166 @@ class UnsupportedApplicationVersionError(Exception):
 
         return "Unsupported version '%s' of application '%s'" %(
           self.version, self.application)
+
+class DuplicateTaskError(Exception):
+    """
+    Duplicate task error.
+
+    Raised when two tasks (for instance, two components of the same profile)
+    are given the same name, since dependencies on them would be ambiguous.
+    """
+
+    def __init__(self, name):
+        """
+        Initialise error information values.
+        """
+
+        self.name = name
+
+    def __str__(self):
+        """
+        Return a string representation.
+        """
+
+        return "Duplicate name '%s'; set a unique name for each component" %(
+          self.name)
+
+class UnknownDependencyError(Exception):
+    """
+    Unknown dependency error.
+
+    Raised when a task (usually a component) requires another which doesn't
+    exist.
+    """
+
+    def __init__(self, name, dependency):
+        """
+        Initialise error information values.
+        """
+
+        self.name = name
+        self.dependency = dependency
+
+    def __str__(self):
+        """
+        Return a string representation.
+        """
+
+        return "'%s' requires unknown component '%s'" %(
+          self.name, self.dependency)
+
+class DependencyCycleError(Exception):
+    """
+    Dependency cycle error.
+
+    Raised when the dependencies between tasks are circular, meaning there's
+    no order in which they could possibly be run.
+    """
+
+    def __init__(self, names):
+        """
+        Initialise error information values.
+        """
+
+        self.names = names
+
+    def __str__(self):
+        """
+        Return a string representation.
+        """
+
+        return "Circular dependencies between '%s'" %("', '".join(self.names))
+
+class DownloadError(Exception):
+    """
+    Download error.
+
+    Raised when a file can't be downloaded, even after retrying.
+    """
+
+    def __init__(self, source, reason):
+        """
+        Initialise error information values.
+        """
+
+        self.source = source
+        self.reason = reason
+
+    def __str__(self):
+        """
+        Return a string representation.
+        """
+
+        return "Failed to download '%s': %s" %(self.source, self.reason)
+
+class ServerSocketError(Exception):
+    """
+    Server socket error.
+
+    Raised when the serve action can't listen on the socket it was given,
+    because the path is taken by something other than a stale socket.
+    """
+
+    def __init__(self, socket, reason):
+        """
+        Initialise error information values.
+        """
+
+        self.socket = socket
+        self.reason = reason
+
+    def __str__(self):
+        """
+        Return a string representation.
+        """
+
+        return "Can't listen on '%s': %s" %(self.socket, self.reason)
+
+class ArchiveError(Exception):
+    """
+    Archive error.
+
+    Raised when an archive can't be extracted: it's in a format we don't
+    understand, it's corrupt, or one of its members would be written outside
+    of the directory we're extracting it to.
+    """
+
+    def __init__(self, archive, reason):
+        """
+        Initialise error information values.
+        """
+
+        self.archive = archive
+        self.reason = reason
+
+    def __str__(self):
+        """
+        Return a string representation.
+        """
+
+        return "Failed to extract '%s': %s" %(self.archive, self.reason)
+
+class ChecksumError(Exception):
+    """
+    Checksum error.
+
+    Raised when a downloaded file's SHA-256 sum isn't the one we expected, in
+    which case it's discarded rather than being used or cached.
+    """
+
+    def __init__(self, source, expected, actual):
+        """
+        Initialise error information values.
+        """
+
+        self.source = source
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        """
+        Return a string representation.
+        """
+
+        return "Checksum mismatch for '%s': expected %s, got %s" %(
+          self.source, self.expected, self.actual)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+from fnmatch import fnmatch
+import os
+import subprocess
+import tarfile
+import threading
+
+from lightbulb.config import extract as extract_config
+import lightbulb.exceptions as exceptions
+from lightbulb.systemspecific import which
+
+# Archive name suffixes
+#   Mapped to the compression format they indicate.
+suffixes = (
+    (".tar.gz",  "gz"),
+    (".tgz",     "gz"),
+    (".tar.bz2", "bz2"),
+    (".tbz2",    "bz2"),
+    (".tar.xz",  "xz"),
+    (".txz",     "xz"),
+)
+
+def compression(name):
+    """
+    Determine an archive's compression format from its name or URL.
+    """
+
+    for (suffix, format) in suffixes:
+        if name.endswith(suffix):
+            return format
+
+    raise exceptions.ArchiveError(name, "unrecognised archive format")
+
+def extract(source, directory, format = None, exclude = ()):
+    """
+    Extract a compressed tar archive into a directory.
+
+    The source may be the path of the archive or a readable file object (such
+    as a DownloadStream); in the latter case the compression format must be
+    given. If a decompression tool is available for the format (see the
+    extract configuration), it decompresses the archive in a separate process
+    while we unpack the result, otherwise we decompress it ourselves.
+
+    Members matching any of the exclude patterns are skipped, along with
+    everything beneath them. Patterns are matched against member paths with
+    the archive's top-level directory removed, so "contrib" excludes
+    nginx-1.0.5/contrib and its contents. Members which would be written
+    outside of the directory, and device files, are rejected.
+    """
+
+    name = source if isinstance(source, str) else "<stream>"
+    if format is None:
+        format = compression(name)
+
+    tool = _find_tool(format)
+
+    try:
+        if tool is None:
+            if isinstance(source, str):
+                archive = tarfile.open(source, "r|%s" %(format))
+            else:
+                archive = tarfile.open(fileobj = source,
+                  mode = "r|%s" %(format))
+
+            with archive:
+                _extract_members(archive, name, directory, exclude)
+        elif isinstance(source, str):
+            with open(source, "rb") as file:
+                _extract_with_tool(tool, file, name, directory, exclude)
+        else:
+            _extract_with_tool(tool, source, name, directory, exclude)
+    except (tarfile.TarError, EOFError) as e:
+        raise exceptions.ArchiveError(name, e)
+
+def _find_tool(format):
+    """
+    Find the decompression tool to use for a format, if any.
+    """
+
+    for tool in extract_config["tools"].get(format, ()):
+        path = which(tool[0])
+        if path is not None:
+            return [path] + list(tool[1:])
+
+    return None
+
+def _extract_with_tool(tool, file, name, directory, exclude):
+    """
+    Extract an archive, having an external tool decompress it.
+
+    A separate thread feeds the compressed data to the tool, so that reading
+    it (perhaps from a download still in progress), decompressing it and
+    unpacking it all happen at once.
+    """
+
+    tool_name = os.path.basename(tool[0])
+
+    try:
+        proc = subprocess.Popen(tool, stdin = subprocess.PIPE,
+          stdout = subprocess.PIPE, stderr = subprocess.DEVNULL)
+    except OSError as e:
+        raise exceptions.ArchiveError(name, "couldn't run %s: %s" %(
+          tool_name, e))
+
+    errors = []
+
+    def feed():
+        try:
+            with proc.stdin:
+                while True:
+                    chunk = file.read(extract_config["chunk_size"])
+                    if not chunk:
+                        break
+                    proc.stdin.write(chunk)
+        except Exception as e:
+            errors.append(e)
+
+    feeder = threading.Thread(target = feed)
+    feeder.daemon = True
+    feeder.start()
+
+    error = None
+
+    try:
+        with proc.stdout:
+            with tarfile.open(fileobj = proc.stdout, mode = "r|") as archive:
+                _extract_members(archive, name, directory, exclude)
+
+            # Let the tool finish, even if the tar stream ended before the
+            # compressed data did
+            while proc.stdout.read(extract_config["chunk_size"]):
+                pass
+    except BaseException as e:
+        proc.kill()
+        error = e
+
+    feeder.join()
+    status = proc.wait()
+
+    # The feeder failing (the download giving up, say) explains any error the
+    # tool or tarfile then ran into, so it takes precedence. The exception is
+    # the tool no longer reading its input, because it failed or because we
+    # killed it after tarfile failed, which the errors below explain better.
+    if errors and not isinstance(errors[0], BrokenPipeError):
+        raise errors[0]
+    if error is not None:
+        raise error
+    if status != 0:
+        raise exceptions.ArchiveError(name, "%s exited with status %d" %(
+          tool_name, status))
+    if errors:
+        raise exceptions.ArchiveError(name, "%s stopped reading the archive"
+          %(tool_name))
+
+def _extract_members(archive, name, directory, exclude):
+    """
+    Extract the members of an open archive, one at a time.
+    """
+
+    kwargs = {}
+
+    # Newer versions of Python warn unless we choose how much to trust the
+    # archive; we do our own checks, and want permissions preserved
+    if hasattr(tarfile, "tar_filter"):
+        kwargs["filter"] = "tar"
+
+    for member in archive:
+        if _excluded(member.name, exclude):
+            continue
+
+        reason = _unsafe(member)
+        if reason is not None:
+            raise exceptions.ArchiveError(name, "%s: %s" %(member.name,
+              reason))
+
+        archive.extract(member, directory, **kwargs)
+
+def _excluded(path, exclude):
+    """
+    Determine whether a member, or one of its parent directories, is excluded.
+    """
+
+    if not exclude:
+        return False
+
+    parts = path.strip("/").split("/")[1:]
+
+    for i in range(1, len(parts) + 1):
+        prefix = "/".join(parts[:i])
+        for pattern in exclude:
+            if fnmatch(prefix, pattern):
+                return True
+
+    return False
+
+def _unsafe(member):
+    """
+    Determine why extracting a member would be unsafe, if it would be.
+    """
+
+    if member.isdev():
+        return "device files aren't allowed"
+
+    if _escapes(member.name):
+        return "path is outside of the archive"
+
+    if member.issym() and _escapes(os.path.join(os.path.dirname(member.name),
+      member.linkname)):
+        return "symbolic link target is outside of the archive"
+
+    if member.islnk() and _escapes(member.linkname):
+        return "hard link target is outside of the archive"
+
+    return None
+
+def _escapes(path):
+    """
+    Determine whether a path within an archive leads outside of it.
+    """
+
+    path = os.path.normpath(path)
+
+    return (os.path.isabs(path) or path == ".."
+      or path.startswith("../"))
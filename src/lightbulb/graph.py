@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import lightbulb.exceptions as exceptions
+
+class TaskGraph:
+    """
+    Dependency graph of tasks.
+
+    Each task is a callable identified by a unique name, optionally requiring
+    that a number of other tasks complete before it can start. When the graph
+    is run, every task whose requirements have been met is scheduled on a pool
+    of worker threads, so independent tasks execute concurrently.
+    """
+
+    def __init__(self):
+        """
+        Initialise an empty graph.
+        """
+
+        self._tasks    = {}
+        self._requires = {}
+        self._names    = []
+
+    def add(self, name, task, requires = ()):
+        """
+        Add a task to the graph.
+        """
+
+        if name in self._tasks:
+            raise exceptions.DuplicateTaskError(name)
+
+        self._tasks[name]    = task
+        self._requires[name] = list(requires)
+        self._names.append(name)
+
+    def order(self):
+        """
+        Get the names of the tasks in an order satisfying their requirements.
+
+        Tasks which don't depend on one another retain the order in which they
+        were added. An error is raised if a task requires one we don't know
+        about, or if the requirements are circular.
+        """
+
+        for name in self._names:
+            for required in self._requires[name]:
+                if required not in self._tasks:
+                    raise exceptions.UnknownDependencyError(name, required)
+
+        order = []
+        done = set()
+        pending = list(self._names)
+
+        while pending:
+            ready = [name for name in pending
+              if all(r in done for r in self._requires[name])]
+
+            if not ready:
+                raise exceptions.DependencyCycleError(pending)
+
+            for name in ready:
+                order.append(name)
+                done.add(name)
+                pending.remove(name)
+
+        return order
+
+    def run(self, jobs = 1):
+        """
+        Run every task in the graph, at most jobs at a time.
+
+        If a task raises an exception, no further tasks are started; we wait
+        for those already running to finish and then re-raise the first error.
+        """
+
+        # Validate the graph before we start anything
+        order = self.order()
+
+        done = set()
+        running = {}
+        error = None
+
+        with ThreadPoolExecutor(max_workers = max(1, jobs)) as executor:
+            while True:
+                if error is None:
+                    for name in order:
+                        if name in done or name in running.values():
+                            continue
+
+                        if all(r in done for r in self._requires[name]):
+                            running[executor.submit(self._tasks[name])] = name
+
+                if not running:
+                    break
+
+                (finished, unfinished) = wait(running,
+                  return_when = FIRST_COMPLETED)
+
+                for future in finished:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        if error is None:
+                            error = future.exception()
+                    else:
+                        done.add(name)
+
+        if error is not None:
+            raise error
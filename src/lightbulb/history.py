@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+import fnmatch
+import json
+import os
+import tempfile
+import threading
+
+from lightbulb.config import history as history_config
+
+class History:
+    """
+    Record of how long past build steps took.
+
+    Steps are identified by name (conventionally "application/version/step"
+    for component build steps), and we keep the most recent durations of
+    each. These are used to estimate how long future builds will take.
+    """
+
+    def __init__(self, path, max_records):
+        """
+        Load the history file, if there is one.
+        """
+
+        self.path        = os.path.expanduser(path)
+        self.max_records = max_records
+
+        self._lock    = threading.Lock()
+        self._records = {}
+        self._new     = {}
+
+        try:
+            with open(self.path) as file:
+                self._records = json.load(file)
+        except (IOError, ValueError):
+            pass
+
+    def record(self, step, duration):
+        """
+        Record the duration of a step.
+        """
+
+        with self._lock:
+            self._records.setdefault(step, []).append(duration)
+            del(self._records[step][:-self.max_records])
+
+            self._new.setdefault(step, []).append(duration)
+
+    def estimate(self, *patterns):
+        """
+        Estimate the duration of a step, or None if we've no idea.
+
+        Each pattern is matched against the names of the steps we've recorded,
+        and we use the average duration of those matching the first pattern to
+        match any. Later patterns should be more general fallbacks: those for
+        any version of an application, for instance.
+        """
+
+        with self._lock:
+            for pattern in patterns:
+                durations = []
+                for step in fnmatch.filter(self._records, pattern):
+                    durations.extend(self._records[step])
+
+                if durations:
+                    return sum(durations) / len(durations)
+
+        return None
+
+    def save(self):
+        """
+        Write the history file.
+
+        Other builds may have saved their own records since we loaded ours, so
+        we merge our new records into whatever's there now.
+        """
+
+        with self._lock:
+            if not self._new:
+                return
+
+            try:
+                with open(self.path) as file:
+                    records = json.load(file)
+            except (IOError, ValueError):
+                records = {}
+
+            for (key, durations) in self._new.items():
+                records.setdefault(key, []).extend(durations)
+                del(records[key][:-self.max_records])
+
+            self._new = {}
+            self._records = records
+
+            os.makedirs(os.path.dirname(self.path), exist_ok = True)
+            (fd, temp_name) = tempfile.mkstemp(
+              dir = os.path.dirname(self.path))
+            with os.fdopen(fd, "w") as file:
+                json.dump(records, file, indent = 1, sort_keys = True)
+
+            os.rename(temp_name, self.path)
+
+_history = None
+_history_lock = threading.Lock()
+
+def get_history():
+    """
+    Get the shared build history, or None if it has been disabled.
+    """
+
+    global _history
+
+    if not history_config["enabled"]:
+        return None
+
+    with _history_lock:
+        if _history is None:
+            _history = History(history_config["path"],
+              history_config["max_records"])
+
+    return _history
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+from contextlib import contextmanager
+import threading
+
+from lightbulb.config import build as build_config
+import lightbulb.systemspecific as systemspecific
+
+def default_jobs():
+    """
+    Determine how many compiler jobs the machine can sustain.
+
+    This is the number of CPUs available to us, reduced if there isn't enough
+    free memory to give each job its share.
+    """
+
+    jobs = systemspecific.cpu_count()
+
+    mem = systemspecific.mem_available()
+    if mem is not None:
+        jobs = min(jobs, mem // build_config["mem_per_job"])
+
+    return max(1, jobs)
+
+class JobBudget:
+    """
+    Machine-wide compiler job budget.
+
+    When several components compile at once, each one's make -j count is drawn
+    from this shared pool, so that between them they never run more jobs than
+    the budget allows. A build always gets at least one job, waiting for other
+    builds to return theirs if the pool is empty.
+
+    Component builds register with the budget for as long as they run (see
+    building()), and unless a build asks for a particular number of jobs it's
+    given a fair share of the pool: its size divided between the builds
+    registered at the time. Otherwise the first build to start compiling would
+    take every job, leaving the rest waiting for it to finish. A make -j count
+    can't grow once make has started, so a build keeps its share even if the
+    others finish first.
+    """
+
+    def __init__(self, size):
+        """
+        Initialise the budget with size jobs.
+        """
+
+        self.size = size
+
+        self._available = size
+        self._builds    = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def building(self):
+        """
+        Register a build for the duration of a with block.
+        """
+
+        with self._condition:
+            self._builds += 1
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._builds -= 1
+
+    def acquire(self, wanted = None):
+        """
+        Take up to wanted jobs from the pool, returning the number granted.
+
+        If wanted isn't given, we take a fair share of the pool.
+        """
+
+        with self._condition:
+            if wanted is None:
+                wanted = -(-self.size // max(1, self._builds))
+
+            wanted = max(1, min(wanted, self.size))
+
+            while self._available < 1:
+                self._condition.wait()
+
+            granted = min(wanted, self._available)
+            self._available -= granted
+
+        return granted
+
+    def release(self, count):
+        """
+        Return jobs to the pool.
+        """
+
+        with self._condition:
+            self._available += count
+            self._condition.notify_all()
+
+    @contextmanager
+    def jobs(self, wanted = None):
+        """
+        Hold jobs from the pool for the duration of a with block.
+        """
+
+        granted = self.acquire(wanted)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
+
+_budget = None
+_budget_lock = threading.Lock()
+
+def get_budget():
+    """
+    Get the shared job budget.
+    """
+
+    global _budget
+
+    with _budget_lock:
+        if _budget is None:
+            _budget = JobBudget(build_config["jobs"] or default_jobs())
+
+    return _budget
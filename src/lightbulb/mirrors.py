@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+
+from lightbulb.config import mirrors as mirrors_config
+
+def probe(url, size, timeout):
+    """
+    Measure how quickly we can download from a URL.
+
+    We time connecting and downloading the first size bytes of the file
+    (asking for only those, where the server allows), which accounts for both
+    the latency of and throughput from the server. Returns the rate in bytes
+    per second, or None if the download failed.
+    """
+
+    request = urllib.request.Request(url)
+    request.add_header("Range", "bytes=0-%d" %(size - 1))
+
+    start = time.time()
+    received = 0
+
+    try:
+        with urllib.request.urlopen(request, timeout = timeout) as response:
+            while received < size:
+                chunk = response.read(size - received)
+                if not chunk:
+                    break
+                received += len(chunk)
+    except (OSError, http.client.HTTPException):
+        return None
+
+    if not received:
+        return None
+
+    return received / max(time.time() - start, 0.001)
+
+class MirrorSelector:
+    """
+    Fastest mirror selector.
+
+    Each application's source archives may be available from several mirrors,
+    given as URL formats taking the version. We probe all of them at once and
+    rank them by how quickly they served us, remembering the ranking for ttl
+    seconds so that we don't probe before every build. The ranking is kept for
+    as long as the same mirrors are configured, whichever version we're
+    downloading, since it's the servers we're measuring rather than the files.
+    """
+
+    def __init__(self, path, ttl, probe_size, probe_timeout):
+        """
+        Load the rankings file, if there is one.
+        """
+
+        self.path          = os.path.expanduser(path)
+        self.ttl           = ttl
+        self.probe_size    = probe_size
+        self.probe_timeout = probe_timeout
+
+        self._lock     = threading.Lock()
+        self._rankings = {}
+
+        try:
+            with open(self.path) as file:
+                self._rankings = json.load(file)
+        except (IOError, ValueError):
+            pass
+
+    def rank(self, application, url_formats, version):
+        """
+        Order an application's mirrors, fastest first.
+
+        Mirrors which failed their probe are placed last, in case they
+        recover, but those which are up are always preferred.
+        """
+
+        url_formats = list(url_formats)
+        if len(url_formats) < 2:
+            return url_formats
+
+        with self._lock:
+            ranking = self._rankings.get(application)
+            if (ranking is not None
+              and sorted(ranking["formats"]) == sorted(url_formats)
+              and time.time() - ranking["time"] < self.ttl):
+                return list(ranking["formats"])
+
+        with ThreadPoolExecutor(max_workers = len(url_formats)) as executor:
+            rates = list(executor.map(lambda url_format: probe(
+              url_format %(version), self.probe_size, self.probe_timeout),
+              url_formats))
+
+        # Ties (mirrors which all failed, say) keep their configured order
+        ranked = [url_format for (url_format, rate) in sorted(
+          zip(url_formats, rates), key = lambda pair: -(pair[1] or 0))]
+
+        with self._lock:
+            self._rankings[application] = {
+                "formats": ranked,
+                "rates"  : dict(zip(url_formats, rates)),
+                "time"   : time.time(),
+            }
+            self._save(application)
+
+        return ranked
+
+    def _save(self, application):
+        """
+        Write the rankings file.
+
+        This is a helper method for rank().
+
+        Other builds may have ranked other applications' mirrors since we loaded
+        the file, so we only replace the one ranking. Failing to write the file
+        isn't fatal; we keep the ranking in memory, and other processes will
+        just have to probe the mirrors again.
+        """
+
+        try:
+            with open(self.path) as file:
+                rankings = json.load(file)
+        except (IOError, ValueError):
+            rankings = {}
+
+        rankings[application] = self._rankings[application]
+        self._rankings = rankings
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok = True)
+            (fd, temp_name) = tempfile.mkstemp(
+              dir = os.path.dirname(self.path))
+            with os.fdopen(fd, "w") as file:
+                json.dump(rankings, file, indent = 1, sort_keys = True)
+
+            os.rename(temp_name, self.path)
+        except OSError:
+            pass
+
+_mirror_selector = None
+_mirror_selector_lock = threading.Lock()
+
+def get_mirror_selector():
+    """
+    Get the shared mirror selector.
+    """
+
+    global _mirror_selector
+
+    with _mirror_selector_lock:
+        if _mirror_selector is None:
+            _mirror_selector = MirrorSelector(mirrors_config["path"],
+              mirrors_config["ttl"], mirrors_config["probe_size"],
+              mirrors_config["probe_timeout"])
+
+    return _mirror_selector
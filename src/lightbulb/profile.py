@@ -5,9 +5,16 @@
 # Licensing information available at
 #   http://github.com/cloudflux/lightbulb
 
+import collections
+from functools import lru_cache
+import hashlib
+import os
+import pickle
 import sys
+import tempfile
 
 import lightbulb.applications as applications
+from lightbulb.config import profile_cache as profile_cache_config
 import lightbulb.constants as constants
 
 
@@ -18,25 +25,73 @@ except ImportError:
       %("PyYAML", "http://pyyaml.org/wiki/PyYAML"))
     sys.exit(constants.EXITSTATUS_MISSINGMODULE)
 
+# YAML loader
+#   Profiles only ever contain plain data, so there's no reason to allow the
+#   arbitrary object construction the default loader permits. The C (libyaml)
+#   implementation is considerably faster, but isn't always available.
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
 def load_file(path):
     """
     Get the contents of a file and parse it into a Profile object.
 
-    This is only here because Luke's lazy and doesn't like closing file
-    descriptors.
+    The parsed YAML is cached, so if the file hasn't changed since we last
+    loaded it we can skip parsing it altogether. We first compare the file's
+    modification time and size with those we recorded; if those differ we
+    compare the SHA-256 sum of its contents, so that merely touching the file
+    doesn't force it to be parsed again.
+
+    Only the file's data is cached, not the Profile built from it, since that
+    also holds defaults taken from the application modules (paths and
+    dependencies, for instance), which can change while the file doesn't.
+    Building the Profile is cheap next to parsing the YAML.
     """
 
+    if not profile_cache_config["enabled"]:
+        with open(path) as file:
+            return load_string(file.read())
+
+    stat = os.stat(path)
+    entry = _load_cache_entry(path)
+
+    if (entry is not None and entry["mtime"] == stat.st_mtime
+      and entry["size"] == stat.st_size):
+        return load_dict(entry["data"])
+
     with open(path) as file:
         string = file.read()
 
-    return load_string(string)
+    sha256 = hashlib.sha256(string.encode("utf-8")).hexdigest()
 
+    if entry is not None and entry["sha256"] == sha256:
+        data = entry["data"]
+    else:
+        data = _parse(string)
+
+    _save_cache_entry(path, {
+        "version": constants.VERSION_STRING,
+        "format" : _cache_format,
+        "mtime"  : stat.st_mtime,
+        "size"   : stat.st_size,
+        "sha256" : sha256,
+        "data"   : data,
+    })
+
+    return load_dict(data)
+
+@lru_cache(maxsize = 128)
 def load_string(string):
     """
     Parse a string into a Profile object.
+
+    Recently parsed profiles are remembered, so that a long-running process
+    handed the same profile again doesn't need to parse it again.
     """
 
-    return load_dict(yaml.load(string))
+    return load_dict(_parse(string))
 
 def load_dict(dict):
     """
@@ -45,6 +100,70 @@ def load_dict(dict):
 
     return Profile(dict)
 
+def _parse(string):
+    """
+    Parse a profile's YAML.
+    """
+
+    return yaml.load(string, Loader = YamlLoader)
+
+def _cache_entry_path(path):
+    """
+    Get the path of the cache entry for a profile file.
+    """
+
+    return "%s/%s" %(os.path.expanduser(profile_cache_config["directory"]),
+      hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest())
+
+# Cache entry format
+#   Bump this whenever the layout of cache entries changes, so that entries
+#   written before the change are ignored. Entries only hold what the profile
+#   file says, never anything derived from the application modules, which can
+#   change without the profile file changing.
+_cache_format = 6
+
+def _load_cache_entry(path):
+    """
+    Load the cache entry for a profile file.
+
+    Returns None if there's no usable entry; entries written by other versions
+    of LightBulb are ignored, since our interpretation of the profile may have
+    changed.
+    """
+
+    try:
+        with open(_cache_entry_path(path), "rb") as file:
+            entry = pickle.load(file)
+    except Exception:
+        return None
+
+    if (entry.get("version") != constants.VERSION_STRING
+      or entry.get("format") != _cache_format):
+        return None
+
+    return entry
+
+def _save_cache_entry(path, entry):
+    """
+    Save the cache entry for a profile file.
+
+    Failing to write the cache isn't fatal; we'll just have to parse the
+    profile again next time.
+    """
+
+    entry_path = _cache_entry_path(path)
+
+    try:
+        os.makedirs(os.path.dirname(entry_path), exist_ok = True)
+
+        (fd, temp_name) = tempfile.mkstemp(dir = os.path.dirname(entry_path))
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump(entry, file, pickle.HIGHEST_PROTOCOL)
+
+        os.rename(temp_name, entry_path)
+    except (IOError, OSError, pickle.PicklingError):
+        pass
+
 class Profile:
     """
     Object representation of a profile file.
@@ -54,12 +173,12 @@ class Profile:
     the profile's key components also takes place here.
     """
 
-    raw = {}
-
-    name = ""
-    description = ""
-
-    components = []
+    # Our attributes
+    #   Every profile has its own values for these; declaring them as slots
+    #   (rather than giving them defaults on the class, which would be shared
+    #   between all instances) also keeps instances compact when loading many
+    #   profiles into one process.
+    __slots__ = ("raw", "name", "description", "components")
 
     def __init__(self, dict):
         """
@@ -67,10 +186,13 @@ class Profile:
         """
 
         self.raw = dict
+        self.components = []
         self._init_meta()
         self._init_component_profiles()
         self._catch_unidentified()
 
+        self.components = tuple(self.components)
+
     def __str__(self):
         """
         Return a "pretty" string representation of ourself.
@@ -108,6 +230,8 @@ class Profile:
         for rc in self.raw["components"]:
             self.components.append(self._init_single_component_profile(rc))
 
+        self._init_component_names()
+
     def _init_single_component_profile(self, raw_component):
         """
         Initialise a single component's data structure.
@@ -123,6 +247,34 @@ class Profile:
         component = getattr(applications, raw_component["application"])
         return component.ComponentProfile(raw_component)
 
+    def _init_component_names(self):
+        """
+        Make sure every component has a unique name.
+
+        This is a helper method for _init_component_profiles().
+
+        Unnamed components take their application's name, so if the same
+        application appears more than once without names, each of those is
+        instead named after its application and position in the profile (e.g.
+        nginx-2). They're built one after another, in profile order, so that
+        they don't install over one another at the same time; components which
+        need to be required by others should be named explicitly.
+        """
+
+        counts = collections.Counter(c.name for c in self.components)
+        previous = {}
+
+        for (index, (rc, c)) in enumerate(zip(self.raw["components"],
+          self.components)):
+            if "name" in rc or counts[c.name] < 2:
+                continue
+
+            c.name = "%s-%d" %(c.application, index)
+            if c.application in previous:
+                c.requires += (previous[c.application],)
+
+            previous[c.application] = c.name
+
     def _catch_unidentified(self):
         """
         Catch any parameters which haven't yet been handled.
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+from contextlib import contextmanager
+import copy
+import json
+import os
+import resource
+import threading
+import time
+
+def _child_cpu_time():
+    """
+    Get the CPU time (user and system) used by our finished child processes.
+    """
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class Report:
+    """
+    Machine-readable record of a build's performance.
+
+    The build is divided into named, timed spans (a stage of the build action
+    or a step of a component's build), each of which records how much CPU
+    time child processes (the compiler, for instance) used during it, along
+    with any details the code within the span adds.
+
+    Child CPU time is only counted once a child has exited, and is shared by
+    the whole process, so spans running concurrently include each other's.
+    """
+
+    def __init__(self):
+        """
+        Start the report.
+        """
+
+        self.spans = []
+
+        self._prefix    = ""
+        self._lock      = threading.Lock()
+        self._start     = time.time()
+        self._child_cpu = _child_cpu_time()
+
+    def prefixed(self, prefix):
+        """
+        Get a view of the report which prefixes the names of its spans.
+
+        This allows a component's builder to name its spans after its steps
+        alone, leaving the build action to say which component they belong to.
+        """
+
+        view = copy.copy(self)
+        view._prefix = self._prefix + prefix
+
+        return view
+
+    @contextmanager
+    def span(self, name, **details):
+        """
+        Time a block of code.
+
+        Yields a dict of details to record with the span, to which the block
+        may add. The span is recorded whether or not the block succeeds.
+        """
+
+        span = {"name": self._prefix + name}
+        span.update(details)
+
+        start = time.time()
+        child_cpu = _child_cpu_time()
+        status = "failed"
+
+        try:
+            yield span
+            status = "succeeded"
+        finally:
+            span["start"]     = start - self._start
+            span["duration"]  = time.time() - start
+            span["child_cpu"] = _child_cpu_time() - child_cpu
+            span["status"]    = status
+
+            with self._lock:
+                self.spans.append(span)
+
+    def summary(self):
+        """
+        Summarise the build.
+
+        Download throughput only takes account of downloads which actually went
+        to the network, rather than being served from the source cache.
+        """
+
+        with self._lock:
+            spans = sorted(self.spans, key = lambda span: span["start"])
+
+        downloads = [span for span in spans
+          if "bytes" in span and not span.get("cached")]
+        download_bytes = sum(span["bytes"] for span in downloads)
+        download_time = sum(span["duration"] for span in downloads)
+
+        own_usage = resource.getrusage(resource.RUSAGE_SELF)
+        child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        # ru_maxrss is in kilobytes on Linux
+        return {
+            "time"                : self._start,
+            "duration"            : time.time() - self._start,
+            "download_bytes"      : download_bytes,
+            "download_throughput" : (download_bytes / download_time
+                                     if download_time else None),
+            "child_cpu"           : (child_usage.ru_utime
+                                     + child_usage.ru_stime - self._child_cpu),
+            "peak_rss_kb"         : own_usage.ru_maxrss,
+            "child_peak_rss_kb"   : child_usage.ru_maxrss,
+            "spans"               : spans,
+        }
+
+    def write(self, path):
+        """
+        Write the report to a JSON file.
+        """
+
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent = 1, sort_keys = True)
+
+    def append(self, path):
+        """
+        Append the report to a JSON lines file, one report per line.
+
+        Keeping every build's report in one file makes it easy to track
+        performance over time.
+        """
+
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+
+        line = json.dumps(self.summary(), sort_keys = True)
+        with open(path, "a") as file:
+            file.write("%s\n" %(line))
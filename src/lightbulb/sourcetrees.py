@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import threading
+
+from lightbulb.config import source_trees as source_trees_config
+from lightbulb.systemspecific import which
+
+class SourceTreeStore:
+    """
+    Store of pristine extracted source trees.
+
+    Each version of an application's source is only ever extracted once, into
+    the store, and is kept there untouched. Every build works on its own clone
+    of it, so any number of builds can configure the same version differently.
+
+    Cloning makes a reflink copy (cp --reflink=always), which shares the data
+    of every file until either copy is written to, falling back to a plain
+    recursive copy. Reflinks need the build to be on the same filesystem as the
+    store, and the filesystem to support them; once they've failed for a build
+    filesystem, we don't try them there again.
+
+    The pristine files are kept read-only, to guard the store against being
+    modified by hand, but every clone is made writable. We don't use hard
+    links: a build writing to a file in place would corrupt the store (and
+    read-only permissions don't stop root), and files make install copies out
+    of the tree would be installed read-only.
+    """
+
+    def __init__(self, directory):
+        """
+        Initialise the store, creating its directory if necessary.
+        """
+
+        self.directory = os.path.expanduser(directory)
+
+        self._locks      = {}
+        self._lock       = threading.Lock()
+        self._cp         = which("cp")
+        self._no_reflink = set()
+
+        os.makedirs(self.directory, exist_ok = True)
+
+    def contains(self, key):
+        """
+        Determine whether we have a tree.
+        """
+
+        return os.path.isdir("%s/%s" %(self.directory, key))
+
+    def checkout(self, key, populate, name, dest):
+        """
+        Clone a source tree into a build's working directory.
+
+        The tree is identified by key, and name is the directory within the
+        extracted source to clone to dest. If we don't have the tree yet,
+        populate is called with a directory to extract the source into. Builds
+        wanting the same tree wait for the first to finish populating it.
+
+        Returns True if the tree was already in the store.
+        """
+
+        pristine = "%s/%s" %(self.directory, key)
+
+        with self._key_lock(key):
+            existed = os.path.isdir(pristine)
+
+            if not existed:
+                self._populate(pristine, populate)
+
+        self._clone("%s/%s" %(pristine, name), "%s/%s" %(dest, name))
+
+        return existed
+
+    def _populate(self, pristine, populate):
+        """
+        Add a tree to the store.
+
+        This is a helper method for checkout().
+
+        Another LightBulb process may be populating the same tree at the same
+        time, in which case whichever finishes first wins and the other's tree
+        is discarded.
+        """
+
+        temp_dir = tempfile.mkdtemp(prefix = ".", dir = self.directory)
+        try:
+            populate(temp_dir)
+            self._set_writable(temp_dir, False)
+        except:
+            shutil.rmtree(temp_dir, ignore_errors = True)
+            raise
+
+        try:
+            os.rename(temp_dir, pristine)
+        except OSError:
+            shutil.rmtree(temp_dir, ignore_errors = True)
+            if not os.path.isdir(pristine):
+                raise
+
+    def _set_writable(self, directory, writable):
+        """
+        Grant or remove write permission on every file in a tree.
+
+        Directories are always left writable, so that the store can be cleaned
+        out. Write permission is only ever granted to the owner.
+        """
+
+        for (parent, dirs, files) in os.walk(directory):
+            for file_name in files:
+                path = "%s/%s" %(parent, file_name)
+                mode = os.lstat(path).st_mode
+                if not stat.S_ISREG(mode):
+                    continue
+
+                if writable:
+                    os.chmod(path, stat.S_IMODE(mode) | stat.S_IWUSR)
+                else:
+                    os.chmod(path, stat.S_IMODE(mode)
+                      & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+    def _clone(self, source, dest):
+        """
+        Clone a pristine tree, as cheaply as we can.
+
+        Files in the clone are independent of the pristine ones, so they're
+        made writable again.
+        """
+
+        device = os.stat(os.path.dirname(dest)).st_dev
+
+        if self._cp is not None and device not in self._no_reflink:
+            if subprocess.call([self._cp, "-a", "--reflink=always", source,
+              dest], stderr = subprocess.DEVNULL) == 0:
+                self._set_writable(dest, True)
+                return
+
+            self._no_reflink.add(device)
+            shutil.rmtree(dest, ignore_errors = True)
+
+        shutil.copytree(source, dest, symlinks = True)
+        self._set_writable(dest, True)
+
+    def _key_lock(self, key):
+        """
+        Get the lock serialising population of a tree.
+        """
+
+        with self._lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+
+            return self._locks[key]
+
+_source_trees = None
+_source_trees_lock = threading.Lock()
+
+def get_source_tree_store():
+    """
+    Get the shared source tree store, or None if it has been disabled.
+    """
+
+    global _source_trees
+
+    if not source_trees_config["enabled"]:
+        return None
+
+    with _source_trees_lock:
+        if _source_trees is None:
+            _source_trees = SourceTreeStore(source_trees_config["directory"])
+
+    return _source_trees
@@ -7,6 +7,7 @@
 
 import os
 import subprocess
+import threading
 
 from lightbulb.config import permission_elevation
 import lightbulb.exceptions as exceptions
@@ -25,27 +26,128 @@ def exec_elevated(args, **etc):
     else:
         raise exceptions.ElevatedApplicationError()
 
-    etc["bufsize"] = 1
-    etc["stdin"]   = None
+    etc.setdefault("bufsize", 1)
+    etc["stdin"] = None
 
     return subprocess.Popen(args, **etc)
 
+_which_cache = {}
+_which_path = None
+_which_lock = threading.Lock()
+
 def which(util, path = None):
     """
     Find a system utility.
     """
 
+    return which_many([util], path)[util]
+
+def which_many(utils, path = None):
+    """
+    Find several system utilities at once.
+
+    Returns a dictionary mapping each utility to its path, or None if it isn't
+    an executable file in any of the directories on the path. Utilities which
+    haven't been found before are all found with a single listing of each
+    directory. We remember where we found them until PATH changes, but never
+    remember failing to find one, since it may yet be installed.
+    """
+
+    global _which_path
+
     if not path:
-        path = os.environ["PATH"]
+        path = os.environ.get("PATH", os.defpath)
+
+    found = {}
+
+    with _which_lock:
+        if os.environ.get("PATH") != _which_path:
+            _which_cache.clear()
+            _which_path = os.environ.get("PATH")
+
+        wanted = set()
+        for util in utils:
+            if "/" in util:
+                found[util] = util if _is_executable(util) else None
+            elif (util, path) in _which_cache:
+                found[util] = _which_cache[(util, path)]
+            else:
+                found[util] = None
+                wanted.add(util)
+
+        for directory in path.split(":"):
+            if not wanted:
+                break
+
+            try:
+                names = wanted.intersection(os.listdir(directory or "."))
+            except OSError:
+                continue
+
+            for util in names:
+                util_path = "%s/%s" %(directory, util)
+                if _is_executable(util_path):
+                    found[util] = util_path
+                    _which_cache[(util, path)] = util_path
+                    wanted.remove(util)
+
+    return found
+
+def _is_executable(path):
+    """
+    Determine whether a path is an executable file.
+    """
 
-    paths = path.split(":")
+    return os.path.isfile(path) and os.access(path, os.X_OK)
 
-    for path in paths:
-        if os.path.isfile("%s/%s" %(path, util)):
-            return "%s/%s" %(path, util)
+def cpu_count():
+    """
+    Get the number of CPUs we're allowed to run on.
+
+    This respects any CPU affinity mask we've been started with (by taskset or
+    a container runtime, say), which os.cpu_count() doesn't.
+    """
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def mem_available():
+    """
+    Get the amount of memory available for new processes, in bytes.
+
+    Returns None if we're unable to determine it.
+    """
+
+    try:
+        with open("/proc/meminfo") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
 
     return None
 
+def compiler_version(cc = "gcc"):
+    """
+    Get the version string of the C compiler.
+
+    This is the first line of the compiler's --version output, or None if the
+    compiler couldn't be found.
+    """
+
+    cc_path = which(cc)
+    if cc_path is None:
+        return None
+
+    proc = subprocess.Popen([cc_path, "--version"], stdout = subprocess.PIPE,
+      stderr = subprocess.DEVNULL, universal_newlines = True)
+    (output, errors) = proc.communicate()
+
+    return output.split("\n")[0].strip()
+
 def _os_name():
     """
     Get OS information.
@@ -62,4 +164,34 @@ def _os_name():
 
     return os_name
 
-os_name = _os_name()
+_os_name_value = None
+_os_name_lock = threading.Lock()
+
+def get_os_name():
+    """
+    Get the name of the operating system, detecting it on first use.
+
+    Returns None if the operating system isn't one we support.
+    """
+
+    global _os_name_value
+
+    with _os_name_lock:
+        if _os_name_value is None:
+            _os_name_value = (_os_name(),)
+
+    return _os_name_value[0]
+
+def __getattr__(name):
+    """
+    Resolve lazily initialised module attributes.
+
+    os_name is kept for compatibility, but is only determined the first time
+    it's accessed rather than whenever this module is imported.
+    """
+
+    if name == "os_name":
+        return get_os_name()
+
+    raise AttributeError("module '%s' has no attribute '%s'" %(
+      __name__, name))
@@ -5,6 +5,8 @@
 # Licensing information available at
 #   http://github.com/cloudflux/lightbulb
 
+import threading
+
 import lightbulb.exceptions as exceptions
 import lightbulb.systemspecific as systemspecific
 
@@ -12,7 +14,7 @@ def _init_pkg_filter():
     """
     """
 
-    if systemspecific.os_name == "Red Hat Linux":
+    if systemspecific.get_os_name() == "Red Hat Linux":
         mod_name = "redhatenterpriselinux"
     else:
         raise exceptions.UnsupportedOperatingSystemError()
@@ -21,4 +23,53 @@ def _init_pkg_filter():
     mod = __import__(mod_name, fromlist = ["package_filter"])
     return getattr(mod, "package_filter")
 
-pkg_filter = _init_pkg_filter()
+_pkg_filter = None
+_pkg_filter_lock = threading.Lock()
+
+def get_pkg_filter():
+    """
+    Get the system's package filter, loading it on first use.
+
+    Raises UnsupportedOperatingSystemError if we don't have a package filter
+    for the system.
+    """
+
+    global _pkg_filter
+
+    with _pkg_filter_lock:
+        if _pkg_filter is None:
+            _pkg_filter = _init_pkg_filter()
+
+    return _pkg_filter
+
+def __getattr__(name):
+    """
+    Resolve lazily initialised module attributes.
+
+    pkg_filter is kept for compatibility, but is only loaded the first time
+    it's accessed rather than whenever this module is imported.
+    """
+
+    if name == "pkg_filter":
+        return get_pkg_filter()
+
+    raise AttributeError("module '%s' has no attribute '%s'" %(
+      __name__, name))
+
+def filter_pkgs(deps):
+    """
+    Translate dependency identifiers into system package names.
+
+    Several identifiers may map onto the same package, so duplicates are
+    removed; the order in which packages first appear is preserved.
+    """
+
+    pkg_filter = get_pkg_filter()
+    pkgs = []
+
+    for dep in deps:
+        pkg = pkg_filter[dep]
+        if pkg not in pkgs:
+            pkgs.append(pkg)
+
+    return pkgs
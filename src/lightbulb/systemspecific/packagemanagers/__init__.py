@@ -5,6 +5,8 @@
 # Licensing information available at
 #   http://github.com/cloudflux/lightbulb
 
+import threading
+
 import lightbulb.exceptions as exceptions
 import lightbulb.systemspecific as systemspecific
 
@@ -12,7 +14,7 @@ def _init_pkg_mgr():
     """
     """
 
-    if systemspecific.os_name == "Red Hat Linux":
+    if systemspecific.get_os_name() == "Red Hat Linux":
         mod_name = "yellowdogupdatermodified"
     else:
         raise exceptions.UnsupportedOperatingSystemError()
@@ -21,4 +23,35 @@ def _init_pkg_mgr():
     mod = __import__(mod_name, fromlist = ["PackageManager"])
     return getattr(mod, "PackageManager")()
 
-pkg_mgr = _init_pkg_mgr()
+_pkg_mgr = None
+_pkg_mgr_lock = threading.Lock()
+
+def get_pkg_mgr():
+    """
+    Get the system's package manager, constructing it on first use.
+
+    Raises UnsupportedOperatingSystemError if we don't support the system's
+    package manager.
+    """
+
+    global _pkg_mgr
+
+    with _pkg_mgr_lock:
+        if _pkg_mgr is None:
+            _pkg_mgr = _init_pkg_mgr()
+
+    return _pkg_mgr
+
+def __getattr__(name):
+    """
+    Resolve lazily initialised module attributes.
+
+    pkg_mgr is kept for compatibility, but is only constructed the first time
+    it's accessed rather than whenever this module is imported.
+    """
+
+    if name == "pkg_mgr":
+        return get_pkg_mgr()
+
+    raise AttributeError("module '%s' has no attribute '%s'" %(
+      __name__, name))
@@ -6,11 +6,14 @@
 #   http://github.com/cloudflux/lightbulb
 #
 
+import os
+import subprocess
 import sys
+import threading
 
 import lightbulb.constants as constants
 import lightbulb.exceptions as exceptions
-from lightbulb.systemspecific import exec_elevated
+from lightbulb.systemspecific import exec_elevated, which
 
 class PackageManager:
     """
@@ -25,13 +28,24 @@ class PackageManager:
     """
 
     _yum_launcher = ""
+    _rpm_launcher = ""
+
+    # The RPM database
+    #   Any change to the set of installed packages touches the files in here,
+    #   so we use their modification times to tell when our index is stale.
+    _rpmdb_path = "/var/lib/rpm"
 
     def __init__(self):
         """
         Perform initialisation.
         """
 
+        self._installed       = None
+        self._installed_mtime = None
+        self._installed_lock  = threading.Lock()
+
         self._find_yum()
+        self._find_rpm()
 
     def _find_yum(self):
         """
@@ -40,6 +54,52 @@ class PackageManager:
 
         self._yum_launcher = "/usr/bin/yum"
 
+    def _find_rpm(self):
+        """
+        Find the rpm query utility.
+        """
+
+        self._rpm_launcher = which("rpm") or "/bin/rpm"
+
+    def _rpmdb_mtime(self):
+        """
+        Get the time the RPM database was last modified.
+        """
+
+        mtime = 0
+
+        try:
+            mtime = os.stat(self._rpmdb_path).st_mtime
+            for name in os.listdir(self._rpmdb_path):
+                mtime = max(mtime,
+                  os.stat("%s/%s" %(self._rpmdb_path, name)).st_mtime)
+        except OSError:
+            pass
+
+        return mtime
+
+    def installed_pkgs(self):
+        """
+        Get the set of names of installed packages.
+
+        Querying rpm is relatively expensive, so we keep an index of the
+        results and only query again once the RPM database has changed.
+        """
+
+        with self._installed_lock:
+            mtime = self._rpmdb_mtime()
+
+            if self._installed is None or mtime != self._installed_mtime:
+                proc = subprocess.Popen([self._rpm_launcher, "-qa",
+                  "--queryformat", "%{NAME}\n"], stdout = subprocess.PIPE,
+                  universal_newlines = True)
+                (output, errors) = proc.communicate()
+
+                self._installed = set(output.split())
+                self._installed_mtime = mtime
+
+            return self._installed
+
     def _exec_cmd(self, action, args):
         """
         """
@@ -69,6 +129,9 @@ class PackageManager:
         if len(pkgs) == 1 and isinstance(pkgs, (list, tuple)):
             pkgs = pkgs[0]
 
-        pkgs = list(pkgs)
+        # Only bother yum (and elevating) for packages we don't already have
+        installed = self.installed_pkgs()
+        pkgs = [pkg for pkg in pkgs if pkg not in installed]
 
-        self._exec_cmd("install", pkgs)
+        if pkgs:
+            self._exec_cmd("install", pkgs)
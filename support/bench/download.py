@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+"""
+Download throughput benchmark.
+
+Serves a file of random data from a local HTTP server and times downloading
+it with Download.download(), reading fixed 4 KiB chunks and reading adaptively
+sized chunks into a reusable buffer.
+"""
+
+import argparse
+import http.server
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+  "..", "..", "src"))
+
+from lightbulb.apphelpers import Download
+
+def serve(data):
+    """
+    Start serving data on the loopback interface, returning its URL.
+    """
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+
+    thread = threading.Thread(target = server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    return "http://127.0.0.1:%d/bench.tar.gz" %(server.server_address[1])
+
+def bench(url, chunk_size, repeat):
+    """
+    Time the fastest of repeat downloads of a URL.
+    """
+
+    best = None
+
+    for i in range(repeat):
+        with open(os.devnull, "wb") as target:
+            start = time.time()
+            Download.download(url, target, lambda chunk_id, size: None,
+              chunk_size = chunk_size)
+            duration = time.time() - start
+
+        if best is None or duration < best:
+            best = duration
+
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip())
+    parser.add_argument("--size", type = int, default = 50,
+      help = "size of the file to download, in MiB")
+    parser.add_argument("--repeat", type = int, default = 5,
+      help = "number of downloads to time, keeping the fastest")
+    arguments = parser.parse_args()
+
+    size = arguments.size * 1024 * 1024
+    url = serve(os.urandom(size))
+
+    for (label, chunk_size) in (("fixed 4 KiB reads", 4096),
+      ("adaptive reads", None)):
+        duration = bench(url, chunk_size, arguments.repeat)
+        print("%-20s%8.3fs%10.1f MiB/s" %(label, duration,
+          size / duration / 1024 / 1024))
+
+if __name__ == "__main__":
+    main()
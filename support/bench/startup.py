@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+"""
+Startup time benchmark.
+
+Times fresh interpreters importing the actions package (which imports its
+submodules lazily), importing it along with every action and application
+module (the cost we used to pay up front), and running lightbulb --help. The
+time taken to start an interpreter which does nothing is subtracted from
+each.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..",
+  "src")
+
+# The code each interpreter runs
+#   Importing the applications package with every module accessed matches the
+#   imports the packages made before they became lazy.
+cases = (
+    ("import lightbulb.actions", ["-c", "import lightbulb.actions"]),
+    ("import everything", ["-c", "import lightbulb.actions as a, "
+                           + "lightbulb.applications as b\n"
+                           + "for m in (a, b):\n"
+                           + "    [getattr(m, n) for n in m.__all__]"]),
+    ("lightbulb --help", [os.path.join(src, "__init__.py"), "--help"]),
+)
+
+def bench(args, repeat):
+    """
+    Time the fastest of repeat runs of a fresh interpreter.
+    """
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = src
+
+    best = None
+
+    for i in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable] + args, env = env,
+          stdout = subprocess.DEVNULL)
+        duration = time.time() - start
+
+        if best is None or duration < best:
+            best = duration
+
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip())
+    parser.add_argument("--repeat", type = int, default = 20,
+      help = "number of runs to time, keeping the fastest")
+    arguments = parser.parse_args()
+
+    baseline = bench(["-c", "pass"], arguments.repeat)
+    print("%-26s%8.1f ms" %("interpreter startup", baseline * 1000))
+
+    for (label, args) in cases:
+        duration = bench(args, arguments.repeat) - baseline
+        print("%-26s%8.1f ms" %(label, duration * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+# LightBulb
+# Copyright (c) 2011 Luke Carrier
+# Licensing information available at
+#   http://github.com/cloudflux/lightbulb
+
+"""
+Download checks.
+
+Exercises Download against a local HTTP server which can be told to drop
+connections part way through, ignore range requests or send the wrong data:
+resuming dropped downloads, giving up on ones which never complete, verifying
+SHA-256 sums without caching bad archives, and segmented downloads.
+"""
+
+import hashlib
+import http.server
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+  "..", "..", "src"))
+
+from lightbulb.apphelpers import Download
+import lightbulb.cache as cache
+from lightbulb.config import download as download_config
+import lightbulb.exceptions as exceptions
+
+# The file we serve
+data = os.urandom(3 * 1024 * 1024 + 12345)
+sha256 = hashlib.sha256(data).hexdigest()
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Request handler, configured through the server's attributes.
+
+    drops is the number of responses still to be cut short after drop_after
+    bytes, and ranges whether we honour Range headers.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _headers(self):
+        server = self.server
+        (first, last) = (0, len(data) - 1)
+
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if match and server.ranges:
+            first = int(match.group(1))
+            if match.group(2):
+                last = min(last, int(match.group(2)))
+
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" %(first, last,
+              len(data)))
+            server.range_requests += 1
+        else:
+            self.send_response(200)
+
+        if server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(last + 1 - first))
+        self.end_headers()
+
+        return (first, last)
+
+    def do_HEAD(self):
+        self._headers()
+
+    def do_GET(self):
+        (first, last) = self._headers()
+        body = data[first:last + 1]
+
+        with self.server.lock:
+            if self.server.drops:
+                self.server.drops -= 1
+                body = body[:self.server.drop_after]
+
+        self.wfile.write(body)
+        self.close_connection = True
+
+class DownloadTest(unittest.TestCase):
+    """
+    Download checks.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0),
+          Handler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+
+        thread = threading.Thread(target = cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        cls.url = "http://127.0.0.1:%d/nginx-1.0.5.tar.gz" %(
+          cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.server.drops          = 0
+        self.server.drop_after     = 0
+        self.server.ranges         = True
+        self.server.range_requests = 0
+
+        self.config = dict(download_config)
+        download_config["backoff"] = 0.01
+        download_config["retries"] = 3
+        download_config["min_segment_size"] = 512 * 1024
+
+        self.directory = tempfile.mkdtemp()
+        self.cache = cache.SourceCache("%s/cache" %(self.directory),
+          1024 * 1024 * 1024)
+
+    def tearDown(self):
+        download_config.clear()
+        download_config.update(self.config)
+
+        shutil.rmtree(self.directory)
+
+    def download(self, **etc):
+        target = io.BytesIO()
+        cached = Download.download(self.url, target, self.progress, **etc)
+
+        return (target.getvalue(), cached)
+
+    def progress(self, chunk_id, chunk_size):
+        pass
+
+    def assertCacheEmpty(self):
+        self.assertIsNone(self.cache.lookup(self.url))
+        self.assertEqual(os.listdir(self.cache.objects.directory), [])
+
+    def test_resumes_dropped_connection(self):
+        self.server.drops = 2
+        self.server.drop_after = 100 * 1024
+
+        (received, cached) = self.download()
+
+        self.assertEqual(received, data)
+        self.assertEqual(self.server.range_requests, 2)
+
+    def test_gives_up_on_incomplete_download(self):
+        self.server.drops = 100
+        self.server.drop_after = 100 * 1024
+        self.server.ranges = False
+
+        with self.assertRaises(exceptions.DownloadError):
+            self.download()
+
+    def test_caches_verified_download(self):
+        (received, cached) = self.download(cache = self.cache,
+          sha256 = sha256)
+        self.assertFalse(cached)
+
+        (received, cached) = self.download(cache = self.cache,
+          sha256 = sha256)
+        self.assertTrue(cached)
+        self.assertEqual(received, data)
+
+    def test_checksum_mismatch_isnt_cached(self):
+        with self.assertRaises(exceptions.ChecksumError):
+            self.download(cache = self.cache, sha256 = "0" * 64)
+
+        self.assertCacheEmpty()
+
+    def test_segmented_download(self):
+        target = "%s/archive" %(self.directory)
+        self.server.drops = 1
+        self.server.drop_after = 1000
+
+        cached = Download.download_segmented(self.url, target, 4,
+          self.progress, cache = self.cache, sha256 = sha256)
+
+        self.assertFalse(cached)
+        with open(target, "rb") as file:
+            self.assertEqual(file.read(), data)
+        self.assertEqual(self.server.range_requests, 5)
+        self.assertTrue(self.cache.contains(self.url, sha256))
+
+    def test_segmented_checksum_mismatch_isnt_cached(self):
+        with self.assertRaises(exceptions.ChecksumError):
+            Download.download_segmented(self.url,
+              "%s/archive" %(self.directory), 4, self.progress,
+              cache = self.cache, sha256 = "0" * 64)
+
+        self.assertCacheEmpty()
+
+    def test_segmented_download_without_ranges(self):
+        target = "%s/archive" %(self.directory)
+        self.server.ranges = False
+
+        Download.download_segmented(self.url, target, 4, self.progress)
+
+        with open(target, "rb") as file:
+            self.assertEqual(file.read(), data)
+        self.assertEqual(self.server.range_requests, 0)
+
+if __name__ == "__main__":
+    unittest.main()